@@ -0,0 +1,228 @@
+"""Look up and extract the members of zip archives (like jars and wheels)."""
+
+import bisect
+import hashlib
+import logging
+import os
+import re
+import stat
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict, namedtuple
+
+
+log = logging.getLogger("OpenContextPath")
+
+# the end of a component that might be an archive within a path leading into
+# it: the extension followed by ! or a separator and the path of a member
+# (like lib/foo.jar!/com/x/Y.java)
+archive_end = re.compile(r"\.(?:zip|jar|war|ear|whl|egg)(?=[!/\\])",
+                         re.IGNORECASE)
+
+# the number of archives whose members are kept in memory
+max_archives = 32
+
+# the number of seconds between checks whether an archive changed
+check_interval = 1
+
+# the directory the members of archives are extracted to
+extract_dir = os.path.join(tempfile.gettempdir(), "OpenContextPath")
+
+# the key (modification time and size), time of the last check and sorted
+# members of an archive (or None if it is no zip archive)
+Archive = namedtuple("Archive", ["key", "checked", "members"])
+
+# the archives by their paths in the order they were last used
+archives = OrderedDict()
+archives_lock = threading.Lock()
+
+
+def split_path(path):
+    """Split a path into the path of an archive, a separator and a member.
+
+    Yields every way to split the path from the first component that might be
+    an archive to the last one, since directories can be named like archives
+    too (like proj.zip/lib/foo.jar!/a).
+    """
+    for match in archive_end.finditer(path):
+        archive, rest = path[:match.end()], path[match.end():]
+        if rest.startswith("!"):
+            rest = rest[1:]
+
+        member = rest.lstrip("/\\")
+        sep = rest[:len(rest) - len(member)]
+        yield archive, sep, member.replace("\\", "/")
+
+
+def is_member_path(path):
+    """Whether a path might lead into an archive."""
+    return archive_end.search(path) is not None
+
+
+def read_members(archive):
+    """Read the sorted members of an archive from its central directory.
+
+    Directories are included with a trailing / even if the archive doesn't
+    store them on their own. Returns None if the file is no zip archive.
+    """
+    try:
+        with zipfile.ZipFile(archive) as zip_file:
+            names = zip_file.namelist()
+    except (OSError, zipfile.BadZipFile) as error:
+        log.debug("Can't read archive %s: %s", archive, error)
+        return None
+
+    members = set()
+    for name in names:
+        members.add(name)
+
+        # add all parent directories until one is known already
+        end = name.rfind("/", 0, len(name) - 1)
+        while end >= 0 and name[:end + 1] not in members:
+            members.add(name[:end + 1])
+            end = name.rfind("/", 0, end)
+
+    log.debug("Read %d members of archive %s", len(members), archive)
+    return tuple(sorted(members))
+
+
+def get_members(archive):
+    """Get the sorted members of an archive.
+
+    Returns None if the path is no zip archive. The central directory is only
+    read again when the modification time or size of the archive change.
+    """
+    now = time.monotonic()
+    with archives_lock:
+        entry = archives.get(archive)
+        if entry is not None:
+            archives.move_to_end(archive)
+            if now - entry.checked < check_interval:
+                return entry.members
+
+    try:
+        status = os.stat(archive)
+    except OSError:
+        return None
+
+    # unpacked eggs and wheels are directories
+    if not stat.S_ISREG(status.st_mode):
+        return None
+
+    key = (status.st_mtime, status.st_size)
+    if entry is not None and entry.key == key:
+        members = entry.members
+    else:
+        members = read_members(archive)
+
+    with archives_lock:
+        archives[archive] = Archive(key, now, members)
+        archives.move_to_end(archive)
+        while len(archives) > max_archives:
+            archives.popitem(last=False)
+
+    return members
+
+
+def contains(members, name):
+    """Whether the sorted members contain a name."""
+    i = bisect.bisect_left(members, name)
+    return i < len(members) and members[i] == name
+
+
+def find_member(path):
+    """Find the archive and member of a path and the archive's members.
+
+    Returns None if the path doesn't lead into a zip archive.
+    """
+    for archive, sep, member in split_path(path):
+        members = get_members(archive)
+        if members is not None:
+            return archive, sep, member, members
+
+    return None
+
+
+def exists(path):
+    """Whether a path within an archive exists.
+
+    Returns None if the path doesn't lead into an archive. The archive itself
+    only counts as a directory if the path ends with a separator.
+    """
+    found = find_member(path)
+    if found is None:
+        return None
+
+    archive, sep, member, members = found
+    if not member:
+        return bool(sep)
+
+    # directories might be mentioned without a trailing separator
+    return contains(members, member) or (
+        not member.endswith("/") and contains(members, member + "/"))
+
+
+def has_prefix(path):
+    """Whether any member of an archive starts with a path.
+
+    Returns None if the path doesn't lead into an archive.
+    """
+    found = find_member(path)
+    if found is None:
+        return None
+
+    archive, sep, member, members = found
+    i = bisect.bisect_left(members, member)
+    return i < len(members) and members[i].startswith(member)
+
+
+def is_dir(path):
+    """Whether a path within an archive is a directory.
+
+    Returns None if the path doesn't lead into an archive.
+    """
+    found = find_member(path)
+    if found is None:
+        return None
+
+    archive, sep, member, members = found
+    if not member:
+        return False
+
+    return member.endswith("/") or contains(members, member + "/")
+
+
+def extract(path):
+    """Extract a file within an archive to a temporary directory.
+
+    Returns the path of the extracted file or None if the path doesn't lead to
+    a file within an archive. A file is only extracted again when the archive
+    changed since then.
+    """
+    found = find_member(path)
+    if found is None:
+        return None
+
+    archive, sep, member, members = found
+    if not member or not contains(members, member) or member.endswith("/"):
+        return None
+
+    # keep the members of each archive in their own directory
+    digest = hashlib.sha1(os.path.abspath(archive).encode(
+        "utf-8", "surrogateescape")).hexdigest()[:16]
+    target_dir = os.path.join(extract_dir, digest)
+    target = os.path.join(target_dir, *member.split("/"))
+
+    try:
+        if os.path.exists(target) and \
+                os.path.getmtime(target) >= os.path.getmtime(archive):
+            return target
+
+        log.debug("Extracting %s from %s", member, archive)
+        with zipfile.ZipFile(archive) as zip_file:
+            return zip_file.extract(member, target_dir)
+    except (OSError, KeyError, zipfile.BadZipFile) as error:
+        log.warning("Can't extract %s from %s: %s", member, archive, error)
+        return None
@@ -0,0 +1,71 @@
+"""Caches for the results of file system lookups."""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TimedCache:
+    """A size-bounded cache whose entries expire after some time."""
+
+    def __init__(self, size, ttl):
+        """Initialize the cache."""
+        self.size = size
+        self.ttl = ttl
+
+        # the entries in the order they were last used with the time they
+        # were added
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, size, ttl):
+        """Change the size and time to live of the cache."""
+        with self.lock:
+            self.size = size
+            self.ttl = ttl
+            self.trim()
+
+    def get(self, key):
+        """Get the value of a key (or None if it isn't cached)."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, added = entry
+                if time.monotonic() - added < self.ttl:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+
+                del self.entries[key]
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        """Set the value of a key (which must not be None)."""
+        if self.size <= 0:
+            return
+
+        with self.lock:
+            self.entries[key] = (value, time.monotonic())
+            self.entries.move_to_end(key)
+            self.trim()
+
+    def trim(self):
+        """Remove the least recently used entries above the size limit."""
+        while len(self.entries) > max(self.size, 0):
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Remove all entries."""
+        with self.lock:
+            self.entries.clear()
+
+    def reset_counters(self):
+        """Reset the number of hits and misses."""
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
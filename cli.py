@@ -0,0 +1,216 @@
+"""Find the file paths in a log from the command line.
+
+Run this module with any Python 3 interpreter from the directory containing
+the package (Sublime Text is not needed):
+
+    python -m OpenContextPath.cli --directory src build.log
+    make 2>&1 | python -m OpenContextPath.cli --unique
+
+Every path is printed as path:line:col (with the line and column as far as
+the patterns found them). The defaults of all options are taken from the
+settings of the package.
+"""
+
+import argparse
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import sys
+from collections import deque
+
+from . import core
+from . import index
+from .patterns import PatternMatcher
+
+
+# the number of lines each process searches at once
+chunk_size = 1000
+
+# the finder and settings of the current process (see init_finder)
+finder = None
+settings = None
+
+
+def load_settings():
+    """Load the default settings of the package (without comments)."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "OpenContextPath.sublime-settings")
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, encoding="utf-8") as file:
+        text = re.sub(r"^\s*//.*$", "", file.read(), flags=re.MULTILINE)
+
+    return json.loads(text)
+
+
+def init_finder(directories, patterns, context, timeout, cache_size,
+                cache_ttl, git, archives=False):
+    """Create the finder and settings of the current process."""
+    global finder, settings
+
+    core.stat_cache.configure(cache_size, cache_ttl)
+    core.listing_cache.configure(cache_size // 10, cache_ttl)
+    core.search_cache.configure(cache_size, cache_ttl)
+    core.prefix_cache.configure(cache_size, cache_ttl)
+
+    # list the files of git repositories once before searching
+    indexes = {}
+    if git:
+        indexes = index.get_git_indexes(directories, float("inf"), True)
+        for git_index in indexes.values():
+            if git_index.repository.tree is None:
+                git_index.repository.build()
+
+    finder = core.PathFinder()
+    settings = core.Settings(
+        context=context,
+        max_context=context,
+        directories=tuple(directories),
+        patterns=PatternMatcher(patterns),
+        indexes=indexes,
+        names=None,
+        timeout=timeout,
+        archives=archives)
+    finder.use_settings(settings)
+
+
+def find_chunk_paths(lines):
+    """Find all paths and their info within some lines."""
+    paths = []
+    for line in lines:
+        paths.extend(finder.scan_line(line.rstrip("\r\n"), settings))
+
+    return paths
+
+
+def read_chunks(file):
+    """Read the lines of a file in chunks."""
+    while True:
+        chunk = list(itertools.islice(file, chunk_size))
+        if not chunk:
+            break
+
+        yield chunk
+
+
+def find_paths(file, jobs, initargs):
+    """Find all paths within the lines of a file.
+
+    Large files are searched by multiple processes while keeping the order of
+    the paths.
+    """
+    chunks = read_chunks(file)
+    first = list(itertools.islice(chunks, 2))
+
+    # starting the processes isn't worth it for a single chunk
+    if jobs <= 1 or len(first) < 2:
+        init_finder(*initargs)
+        for chunk in itertools.chain(first, chunks):
+            yield from find_chunk_paths(chunk)
+        return
+
+    with multiprocessing.Pool(jobs, init_finder, initargs) as pool:
+        # only keep a few chunks in memory at once
+        pending = deque()
+        for chunk in itertools.chain(first, chunks):
+            pending.append(pool.apply_async(find_chunk_paths, (chunk,)))
+            if len(pending) >= 4 * jobs:
+                yield from pending.popleft().get()
+
+        while pending:
+            yield from pending.popleft().get()
+
+
+def format_path(path, info):
+    """Encode the line and column numbers into a path."""
+    path = os.path.normpath(path)
+    if info.get("line"):
+        path += ":{}".format(info["line"])
+        if info.get("col"):
+            path += ":{}".format(info["col"])
+
+    return path
+
+
+def main(argv=None):
+    """Find the paths in a log from the command line."""
+    defaults = load_settings()
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("file", nargs="?", default="-",
+                        help="the log to search (or - for stdin)")
+    parser.add_argument("-d", "--directory", action="append",
+                        dest="directories",
+                        help="a directory (or a pattern like src/**/include) "
+                        "to consider for relative paths (the current "
+                        "directory by default)")
+    parser.add_argument("-p", "--pattern", action="append", dest="patterns",
+                        help="a pattern to match the line and column after "
+                        "a path (the patterns of the settings by default)")
+    parser.add_argument("-c", "--context", type=int,
+                        default=defaults.get("max_context", 4096),
+                        help="the number of characters to analyze on each "
+                        "side of a position (longer lines are searched in "
+                        "windows of twice this size)")
+    parser.add_argument("-j", "--jobs", type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="the number of processes for large logs")
+    parser.add_argument("-u", "--unique", action="store_true",
+                        help="print each path only once")
+    parser.add_argument("-g", "--git", action="store_true",
+                        help="take the files of directories within git "
+                        "repositories from their index")
+    parser.add_argument("-a", "--archives", action="store_true",
+                        default=defaults.get("search_archives", False),
+                        help="find paths leading into zip archives (like "
+                        "lib/foo.jar!/com/x/Y.java)")
+    args = parser.parse_args(argv)
+
+    directories = index.expand_directories(
+        [os.path.abspath(os.path.expanduser(dir))
+         for dir in args.directories or [os.curdir]],
+        defaults.get("index_ttl", 60), defaults.get("index_limit", 100000),
+        [], wait=True)
+    patterns = args.patterns or defaults.get("patterns", [])
+    cache_size = defaults.get("cache_size", 10000)
+    initargs = (directories, patterns, args.context,
+                defaults.get("probe_timeout", 0) / 1000, cache_size,
+                defaults.get("cache_ttl", 10), args.git, args.archives)
+
+    # logs can contain anything, so never fail because of the encoding
+    if args.file == "-":
+        file = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8",
+                                errors="replace")
+    else:
+        try:
+            file = open(args.file, encoding="utf-8", errors="replace")
+        except OSError as error:
+            parser.error("can't open {}: {}".format(args.file,
+                                                    error.strerror))
+
+    found = set()
+    try:
+        with file:
+            for path, info in find_paths(file, args.jobs, initargs):
+                # keep only the first position of each path
+                if args.unique:
+                    key = os.path.normpath(path)
+                    if key in found:
+                        continue
+                    found.add(key)
+
+                print(format_path(path, info))
+    except BrokenPipeError:
+        # the reader of the output (like head) is gone, so the rest of it is
+        # discarded instead of failing again when Python flushes it at exit
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
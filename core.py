@@ -0,0 +1,813 @@
+"""Find file paths within texts without Sublime Text.
+
+This is the part of the package that doesn't depend on Sublime Text so it can
+be used from the command line as well (see cli.py).
+"""
+
+import bisect
+import errno
+import logging
+import os
+import re
+import sys
+from collections import namedtuple
+
+from . import archives
+from . import cache
+from . import metrics
+from . import probing
+from .patterns import PatternMatcher
+
+
+if sys.platform.startswith("win"):
+    platform = "windows"
+elif sys.platform == "darwin":
+    platform = "osx"
+else:
+    platform = "linux"
+
+log = logging.getLogger("OpenContextPath")
+
+# the maximum length of a single file name on all supported file systems
+max_name_length = 255
+
+# the references to parent directories (including both dot pairs of "...")
+# and the characters that separate the words a path can consist of
+parent_refs = re.compile(r"(?=\.\.)")
+word_ends = re.compile(r"[\s\"'<>|]")
+
+# a variable at the end of a path that the following parts might complete
+open_variable = re.compile(r"(\$\w*|\$\{[^}]*|%\w*)\Z")
+
+# the results of all recent file system lookups, directory listings,
+# searches for paths and prefixes within the directories
+stat_cache = cache.TimedCache(size=10000, ttl=10)
+listing_cache = cache.TimedCache(size=1000, ttl=10)
+search_cache = cache.TimedCache(size=10000, ttl=10)
+prefix_cache = cache.TimedCache(size=10000, ttl=10)
+
+# probes the file system with a time limit
+prober = probing.Prober()
+
+# the timings of all phases of finding and opening paths
+stats = metrics.Metrics()
+
+# a snapshot of all settings that are needed to find paths
+Settings = namedtuple("Settings", [
+    "context", "max_context", "directories", "patterns", "indexes", "names",
+    "timeout", "archives"
+])
+
+
+def is_ascii(text):
+    """Whether a text consists of ASCII characters only."""
+    try:
+        text.encode("ascii")
+    except UnicodeEncodeError:
+        return False
+
+    return True
+
+
+def cut_window(text):
+    """Cut a window of a long line after its last word end.
+
+    Returns the length of the window, which is the whole text if it doesn't
+    contain any word end.
+    """
+    match = word_ends.search(text[::-1])
+    if match is None:
+        return len(text)
+
+    return len(text) - match.start()
+
+
+def clear_caches():
+    """Forget about the results of all file system lookups."""
+    stat_cache.clear()
+    listing_cache.clear()
+    search_cache.clear()
+    prefix_cache.clear()
+
+
+class PathScan:
+    """The parts of a text and the paths that can be built from them.
+
+    The text is only split into parts as far as they are needed. The results
+    of all lookups are remembered so that the paths at multiple cursor
+    positions within the same text can be extracted cheaply.
+    """
+
+    def __init__(self, finder, text, dirs):
+        """Prepare splitting the text into possible parts of a file path."""
+        self.finder = finder
+        self.text = text
+        self.dirs = dirs
+
+        # remember the offsets at which the parts start (the parts cover the
+        # whole text so these are the sums of the lengths of all previous
+        # parts)
+        self.parts = []
+        self.offsets = []
+        self.matches = finder.file_parts.finditer(text)
+
+        # the offsets of the references to parent directories and of the ends
+        # of all words (only found once they are needed)
+        self.parent_offsets = None
+        self.word_ends = None
+
+        # whether any path was extended up to the end of the text
+        self.cut_off = False
+
+        # the longest existing paths starting with each part and whether the
+        # parts exist on their own
+        self.paths = {}
+        self.existing_parts = {}
+
+    def split_part(self):
+        """Split the next part from the text.
+
+        Returns False if the whole text was split already.
+        """
+        match = next(self.matches, None)
+        if match is None:
+            return False
+
+        self.parts.append(match.group())
+        self.offsets.append(match.start())
+        return True
+
+    def has_part(self, i):
+        """Whether the text has an i-th part (splitting it if necessary)."""
+        while len(self.parts) <= i:
+            if not self.split_part():
+                return False
+
+        return True
+
+    def count_parts(self, cur):
+        """Count the parts starting at or before a position."""
+        parts, offsets = self.parts, self.offsets
+        if not offsets or offsets[-1] <= cur:
+            for match in self.matches:
+                parts.append(match.group())
+                offsets.append(match.start())
+                if offsets[-1] > cur:
+                    break
+
+        return bisect.bisect_right(offsets, cur)
+
+    def has_parent_after(self, offset):
+        """Whether the word at an offset continues with a parent reference.
+
+        A path can only lead through a missing directory if a parent reference
+        within the same word leads out of it again.
+        """
+        if self.parent_offsets is None:
+            self.parent_offsets = [
+                match.start() for match in parent_refs.finditer(self.text)]
+            self.word_ends = [
+                match.start() for match in word_ends.finditer(self.text)]
+
+        i = bisect.bisect_right(self.parent_offsets, offset)
+        if i == len(self.parent_offsets):
+            return False
+
+        j = bisect.bisect_right(self.word_ends, offset)
+        return j == len(self.word_ends) or \
+            self.word_ends[j] > self.parent_offsets[i]
+
+    def part_exists(self, i):
+        """Whether the i-th part is an existing path on its own."""
+        exists = self.existing_parts.get(i)
+        if exists is None:
+            exists = self.finder.search_path(self.parts[i], self.dirs) \
+                is not None
+            self.existing_parts[i] = exists
+
+        return exists
+
+    def path_from(self, i):
+        """Find the longest existing path starting with the i-th part."""
+        if i not in self.paths:
+            part = self.parts[i]
+
+            # find the longest path that can be constructed from all the parts
+            # after this one
+            path = self.finder.extend_path(self, i, self.dirs)
+            if path == part and not self.part_exists(i):
+                path = None
+
+            self.paths[i] = path
+
+        return self.paths[i]
+
+    def extract(self, cur):
+        """Extract the file path around a cursor position."""
+        # the parts before the cursor are all the ones starting at or before it
+        count = self.count_parts(cur)
+        parts, offsets = self.parts, self.offsets
+
+        if log.isEnabledFor(logging.DEBUG):
+            self.has_part(len(self.text))
+            log.debug("Before cursor: %s", parts[:count])
+            log.debug("After cursor: %s", parts[count:])
+
+        # a path containing the cursor can't start further away than the
+        # longest possible name if there is no separator in between (unless a
+        # parent reference removes that name again)
+        limit = cur - max_name_length - 1
+        if limit < 0 or self.has_parent_after(cur) or \
+                self.finder.has_separators(self.text[limit:cur]):
+            limit = -1
+
+        # go through the parts before the cursor to find the ones that mark the
+        # beginning of a file path
+        path = ""
+        begin, end = 0, 0
+        for i in reversed(range(count)):
+            if offsets[i] <= limit:
+                break
+
+            # in case we haven't found the beginning of a path yet, it could be
+            # that there is a file consisting of multiple parts in which case
+            # we just need to blindly start testing for this possibility
+            if path != "" and not self.part_exists(i):
+                continue
+
+            existing_path = self.path_from(i)
+            if existing_path is not None:
+                log.debug("Found path: %s", existing_path)
+
+                # check if the cursor is actually inside the found path
+                len_existing_path = len(existing_path)
+                if offsets[i] + len_existing_path >= cur:
+                    # keep the longest path
+                    if len_existing_path > len(path):
+                        log.debug("Best path: %s", existing_path)
+                        path = existing_path
+                        begin = offsets[i]
+                        end = begin + len_existing_path
+
+        if path:
+            # search again to return the full path for relative paths
+            return self.finder.search_path(path, self.dirs), (begin, end)
+
+        return None, None
+
+    def extract_all(self):
+        """Extract all file paths within the text.
+
+        Yields the same paths and scopes that extract would find when the
+        cursor is moved through the text from left to right.
+        """
+        last = None
+        for cur, best in self.segments():
+            if best is not None and best != last:
+                last = best
+                begin, end, i = best
+                path = self.finder.search_path(self.paths[i], self.dirs)
+                yield path, (begin, end)
+
+    def segments(self):
+        """Split the text into segments in which extract finds the same path.
+
+        Yields the first cursor position of each segment and the scope and
+        index of the first part of the path (or None if there is no path).
+        """
+
+        self.has_part(len(self.text))
+
+        # the scopes of all paths that could be found by extract
+        scopes = []
+        for i, begin in enumerate(self.offsets):
+            path = self.path_from(i)
+            if path is not None:
+                scopes.append((begin, begin + len(path), i))
+
+        # the result can only change where one of these scopes starts or ends
+        points = sorted(set(
+            point for begin, end, i in scopes for point in (begin, end + 1)))
+
+        # only the scopes starting at most this far before a cursor can
+        # contain it
+        begins = [begin for begin, end, i in scopes]
+        longest = max([end - begin for begin, end, i in scopes] or [0])
+
+        for cur in points:
+            # the path found by extract is the longest one containing the
+            # cursor, but all paths starting before the last one must exist
+            # on their own
+            best = None
+            for j in reversed(range(bisect.bisect_right(begins, cur))):
+                begin, end, i = scopes[j]
+                if begin < cur - longest:
+                    break
+                elif end < cur:
+                    continue
+
+                if best is not None:
+                    if end - begin <= best[1] - best[0]:
+                        continue
+                    elif not self.part_exists(i):
+                        continue
+
+                best = (begin, end, i)
+
+            yield cur, best
+
+
+class PathFinder:
+    """Find file paths within texts."""
+
+    # the regex to split a text into individual parts of a possible path
+    file_parts_unix = re.compile(
+        r"((\w+|\.\.?)/*|\W)", re.IGNORECASE)
+    file_parts_win = re.compile(
+        r"([A-Z]:[/\\]+|(\w+|\.\.?)[/\\]*|\W)", re.IGNORECASE)
+
+    file_parts = (file_parts_unix if platform != "windows" else file_parts_win)
+
+    # the indexes of the directories currently being searched
+    indexes = {}
+
+    # the index of all file names for bare names and partial paths (or None)
+    names = None
+
+    # the number of seconds to wait for each file system lookup (or None to
+    # wait as long as it takes)
+    timeout = None
+
+    # the time limit shared by all lookups of a command (or None to give each
+    # lookup the whole timeout)
+    deadline = None
+
+    # whether paths can lead into zip archives (see archives.py)
+    search_archives = False
+
+    def get_patterns(self):
+        """Collect the current list of patterns (none by default)."""
+        return []
+
+    def use_settings(self, settings):
+        """Search with the indexes and time limit of a settings snapshot."""
+        self.indexes = settings.indexes
+        self.names = settings.names
+        self.timeout = settings.timeout or None
+        self.search_archives = settings.archives
+
+    def resolve_line(self, text, settings):
+        """Find the paths at all positions within the text of a line.
+
+        Returns the positions at which the path found at a cursor changes, the
+        path and info found from there on and the scopes of all paths.
+        """
+        dirs = settings.directories
+        scan = self.scan_text(text, dirs)
+        with stats.timer("search"):
+            segments = list(scan.segments())
+
+        # each path can be found in multiple segments
+        found = {None: None}
+        starts, results, scopes = [], [], []
+        for cur, best in segments:
+            if best not in found:
+                begin, end, i = best
+                path = self.search_path(scan.paths[i], dirs)
+                if path:
+                    found[best] = (path, self.get_info(
+                        text, (begin, end), path, dirs, settings))
+                    scopes.append((begin, end))
+                else:
+                    found[best] = None
+
+            starts.append(cur)
+            results.append(found[best])
+
+        return starts, results, scopes
+
+    def find_span(self, spans, cur):
+        """Find the path and info at a position within a line (or None)."""
+        starts, results, scopes = spans
+        i = bisect.bisect_right(starts, cur) - 1
+        return results[i] if i >= 0 else None
+
+    def get_info(self, text, scope, path, dirs, settings):
+        """Get the additional information about a path found in a text."""
+
+        # match the text after the path
+        info = self.match_patterns(text[scope[1]:], settings.patterns)
+
+        # let the user choose if a bare name is ambiguous
+        alternatives = self.find_alternatives(
+            text[scope[0]:scope[1]], path, dirs)
+        if alternatives:
+            info["alternatives"] = alternatives
+
+        self.classify_path(path, info)
+        return info
+
+    def classify_path(self, path, info):
+        """Remember whether a found path is a directory if this is known.
+
+        Only the indexes and archives are asked, so opening the path later
+        just needs to check the file system if none of them knows the path.
+        """
+        if self.search_archives:
+            is_dir = archives.is_dir(path)
+            if is_dir is not None:
+                info["is_dir"] = is_dir
+                return
+
+        if path.endswith((os.path.sep, os.path.altsep or os.path.sep)):
+            info["is_dir"] = True
+            return
+
+        for dir, dir_index in self.indexes.items():
+            root = os.path.join(dir, "")
+            if path.startswith(root):
+                is_dir = dir_index.is_dir(path[len(root):])
+                if is_dir is not None:
+                    info["is_dir"] = is_dir
+                    return
+
+        # the name index only contains files
+        if self.names is not None and \
+                path in self.names.find(os.path.basename(path)):
+            info["is_dir"] = False
+
+    def scan_text(self, text, dirs):
+        """Split a text into parts to extract paths from."""
+        with stats.timer("tokenize"):
+            return PathScan(self, text, dirs)
+
+    def extract_paths(self, text, dirs):
+        """Extract all file paths within a text."""
+        scan = self.scan_text(text, dirs)
+        with stats.timer("search"):
+            return list(scan.extract_all())
+
+    def scan_line(self, line, settings):
+        """Find all paths within a line.
+
+        The whole line is searched at once, so each path and its info are the
+        same as the ones found with the cursor placed on it. Lines longer than
+        twice max_context are searched in windows of that size which end after
+        a word (see cut_window).
+        """
+        size = 2 * settings.max_context
+        begin = 0
+        while begin < len(line):
+            window = line[begin:begin + size]
+            if begin + size < len(line):
+                window = window[:cut_window(window)]
+            begin += len(window)
+
+            for path, info in self.scan_window(window, settings):
+                yield path, info
+
+    def scan_window(self, text, settings):
+        """Find all paths within a window of a line."""
+        dirs = settings.directories
+        scopes = set()
+        for path, scope in self.extract_paths(text, dirs):
+            if path and scope not in scopes:
+                scopes.add(scope)
+                yield path, self.get_info(text, scope, path, dirs, settings)
+
+    def extract_path(self, text, cur, dirs):
+        """Extract a file path around a cursor position within a text."""
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Extracting from: %s^%s", text[:cur], text[cur:])
+            log.debug("Directories: %s", dirs)
+
+        scan = self.scan_text(text, dirs)
+        with stats.timer("search"):
+            return scan.extract(cur)
+
+    def extend_path(self, scan, i, dirs):
+        """Find the longest existing path starting with a part of a scan.
+
+        Returns the i-th part itself if no longer path exists. The following
+        parts are only split from the text as far as they are needed.
+        """
+        sep = (os.path.sep, os.path.altsep or os.path.sep)
+        parts = scan.parts
+        existing_path = parts[i]
+        new_path = existing_path
+        name_length = 0 if new_path.endswith(sep) else len(new_path)
+
+        # most parts of a text can't even be the beginning of a name
+        if name_length and self.is_dead_end(new_path, name_length, dirs):
+            return existing_path
+        j = i + 1
+        while scan.has_part(j):
+            part = parts[j]
+            new_path += part
+            if self.search_path(new_path, dirs):
+                log.debug("Path: %s", new_path)
+                existing_path = new_path
+
+            # stop as soon as no longer path can exist (unless a parent
+            # reference later on leads out of it again)
+            elif not scan.has_parent_after(scan.offsets[j]):
+                # the directory this would be in doesn't exist
+                if part.endswith(sep):
+                    if self.expand_variables(new_path) is not None:
+                        break
+                elif self.is_dead_end(
+                        new_path, name_length + len(part), dirs):
+                    break
+
+            name_length = 0 if part.endswith(sep) else name_length + len(part)
+            j += 1
+        else:
+            # the path might continue after the end of the text
+            scan.cut_off = True
+
+        return existing_path
+
+    def is_dead_end(self, path, name_length, dirs):
+        """Whether no existing path can start with the given path."""
+        if self.has_variables(path):
+            path = self.expand_variables(path)
+            if path is None:
+                return False
+
+            name_length = len(re.split(r"[/\\]", path)[-1])
+
+        # the members of archives are only known to the archives
+        if self.search_archives:
+            found = [archives.has_prefix(os.path.join(dir, path)) for dir in
+                     ([""] if os.path.isabs(path) else dirs)]
+            if any(found):
+                return False
+            elif None not in found:
+                return True
+
+        # no file system supports longer names
+        if name_length > max_name_length:
+            return True
+
+        # Windows ignores trailing dots and spaces and the names on macOS can
+        # be normalized differently, so only simple names can be compared
+        head, sep, name = path.replace(os.path.altsep or os.path.sep,
+                                       os.path.sep).rpartition(os.path.sep)
+        if not name or name[-1] in ". " or not is_ascii(name):
+            return False
+
+        # check whether any entry in the directory starts with the name
+        dead_end = prefix_cache.get((dirs, path))
+        if dead_end is None:
+            dead_end = True
+            for dir in ([""] if os.path.isabs(path) else dirs):
+                dir_index = self.indexes.get(dir)
+                exists = dir_index.has_prefix(path) if dir_index else None
+                if exists is None:
+                    exists = self.has_entry_with_prefix(
+                        os.path.join(dir, head + sep), name)
+
+                if exists is not False:
+                    dead_end = False
+                    break
+
+            # bare names and partial paths can be anywhere in the name index
+            if dead_end and self.names is not None and \
+                    not os.path.isabs(path):
+                dead_end = self.names.has_prefix(name) is False
+
+            prefix_cache.set((dirs, path), dead_end)
+
+        return dead_end
+
+    def has_entry_with_prefix(self, dir, prefix):
+        """Whether any entry of a directory starts with a prefix.
+
+        Returns None if the directory can't be read.
+        """
+        if os.path.normcase("A") == "a" or platform == "osx":
+            # case-insensitive file systems
+            prefix = prefix.lower()
+            key = (dir, True)
+        else:
+            key = (dir, False)
+
+        names = listing_cache.get(key)
+        if names is None:
+            try:
+                with stats.timer("listdir"):
+                    if self.timeout is None:
+                        names = os.listdir(dir)
+                    else:
+                        names = prober.run(dir, self.get_deadline(),
+                                           os.listdir, dir)
+                if names is None:
+                    return None
+            except OSError as error:
+                if error.errno not in (errno.ENOENT, errno.ENOTDIR):
+                    return None
+
+                names = []
+
+            if key[1]:
+                names = [name.lower() for name in names]
+
+            names = tuple(sorted(names))
+            listing_cache.set(key, names)
+
+        i = bisect.bisect_left(names, prefix)
+        return i < len(names) and names[i].startswith(prefix)
+
+    def has_separators(self, text):
+        """Whether a text contains separators or variables."""
+        if os.path.sep in text or "~" in text:
+            return True
+        elif os.path.altsep and os.path.altsep in text:
+            return True
+
+        return self.has_variables(text)
+
+    def has_variables(self, path):
+        """Whether a path contains variables that change its length."""
+        return "$" in path or "%" in path or path.startswith("~")
+
+    def expand_variables(self, path):
+        """Expand the variables within a path like find_path does.
+
+        Returns None if the following parts might still complete a variable at
+        the end of the path.
+        """
+        if open_variable.search(path):
+            return None
+
+        # the name of a user ends with the first separator
+        if path.startswith("~"):
+            if not re.search(r"[/\\]", path):
+                return None
+
+            path = os.path.expanduser(path)
+
+        return os.path.expandvars(path)
+
+    def match_patterns(self, text, patterns=None):
+        """Match some text for additional information about a path."""
+        log.debug("Matching patterns to: %s", text)
+
+        if patterns is None:
+            patterns = PatternMatcher(self.get_patterns())
+
+        # find the first matching pattern and return all named groups
+        with stats.timer("match"):
+            info = patterns.match(text)
+        if info:
+            log.debug("Found groups: %s", info)
+
+        return info
+
+    def search_path(self, path, dirs):
+        """Search for an existing path (possibly relative to dirs)."""
+
+        # the same parts are searched again and again in similar texts (like
+        # the lines of a build output)
+        found = search_cache.get((dirs, path))
+        if found is None:
+            found, complete = self.find_path(path, dirs)
+            found = found or ""
+            if complete:
+                search_cache.set((dirs, path), found)
+
+        return found or None
+
+    def find_path(self, path, dirs):
+        """Find an existing path (possibly relative to dirs).
+
+        Returns the path and whether all directories could be checked in time.
+        """
+
+        # ignore special directories with no separator
+        if path in [".", ".."]:
+            return None, True
+
+        # expand ~ to the user's home directory
+        if path.startswith("~"):
+            path = os.path.expanduser(path)
+
+        # expand the environment variables
+        path = os.path.expandvars(path)
+
+        if platform == "windows":
+            # disable UNC paths on Windows
+            if path.startswith("\\\\") or path.startswith("//"):
+                return None, True
+
+            # ignore spaces at the end of a path
+            if path.endswith(" "):
+                return None, True
+
+        if os.path.isabs(path):  # absolute paths
+            exists = self.path_exists("", path)
+            return (path if exists else None), exists is not None
+        else:  # relative paths
+            # with a time limit all directories are probed at the same time so
+            # a single slow directory doesn't hold up the others
+            futures = {}
+            if self.timeout is not None:
+                deadline = self.get_deadline()
+                for dir in dirs:
+                    if deadline.expired():
+                        break
+
+                    if self.known_exists(dir, path) is None:
+                        futures[dir] = (deadline, prober.submit(
+                            dir, os.path.exists, os.path.join(dir, path)))
+
+            complete = True
+            for dir in dirs:
+                exists = self.path_exists(dir, path, *futures.get(dir, ()))
+                if exists is None:
+                    complete = False
+                elif exists:
+                    return os.path.join(dir, path), complete
+
+            # resolve bare names and partial paths anywhere in the project
+            if self.names is not None:
+                paths = self.names.find(path)
+                if paths:
+                    return paths[0], complete
+
+                complete = complete and self.names.is_ready()
+
+            return None, complete
+
+    def find_alternatives(self, path, found, dirs):
+        """Find all files a bare name or partial path could refer to.
+
+        Returns an empty list unless the path was found in the name index and
+        is ambiguous.
+        """
+        if self.names is None:
+            return []
+
+        path = os.path.expandvars(os.path.expanduser(path))
+        if os.path.isabs(path):
+            return []
+
+        # paths within the directories are never ambiguous
+        if any(os.path.join(dir, path) == found for dir in dirs):
+            return []
+
+        paths = self.names.find(path)
+        if len(paths) > 1 and paths[0] == found:
+            return paths
+
+        return []
+
+    def path_exists(self, dir, path, deadline=None, future=None):
+        """Check whether a path relative to a directory exists.
+
+        Returns None if this couldn't be checked in time.
+        """
+
+        # the indexes and the file system don't know the members of archives
+        if self.search_archives:
+            exists = archives.exists(os.path.join(dir, path))
+            if exists is not None:
+                return exists
+
+        exists = self.known_exists(dir, path)
+        if exists is not None:
+            return exists
+
+        full_path = os.path.join(dir, path)
+        with stats.timer("stat"):
+            if self.timeout is None:
+                exists = os.path.exists(full_path)
+            elif future is None:
+                # absolute paths are blamed on their parent directory
+                exists = prober.run(dir or os.path.dirname(full_path),
+                                    self.get_deadline(), os.path.exists,
+                                    full_path)
+            else:
+                exists = prober.wait(future, dir, deadline)
+
+            if exists is None:
+                return None
+
+        stat_cache.set((dir, path), exists)
+        return exists
+
+    def get_deadline(self):
+        """Get the time limit of a lookup on the file system."""
+        return self.deadline or probing.Deadline(self.timeout)
+
+    def known_exists(self, dir, path):
+        """Check whether a path exists without the file system.
+
+        Returns None if neither the directory's index nor the cache know.
+        """
+        dir_index = self.indexes.get(dir)
+        exists = dir_index.exists(path) if dir_index else None
+        if exists is None:
+            exists = stat_cache.get((dir, path))
+
+        return exists
@@ -0,0 +1,1083 @@
+"""Index the contents of directories to answer path lookups from memory."""
+
+import bisect
+import fnmatch
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+log = logging.getLogger("OpenContextPath")
+
+# marks a subtree whose contents are not known (because it was excluded, is a
+# symlink or the index limit was reached) and must be checked on disk
+UNKNOWN = "unknown"
+
+# the version of the format of the cache files
+cache_version = 1
+
+# the characters that turn an entry of the directories into a pattern
+glob_chars = re.compile(r"[*?[]")
+
+# incremented whenever the directories matching any pattern change
+glob_generation = 0
+
+# the number of seconds between checks whether the index of a git repository
+# changed
+git_check_interval = 1
+
+# hide the console window of git on Windows
+if os.name == "nt":
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+else:
+    startupinfo = None
+
+# all indexes by their root directory, the name indexes by their roots, the
+# globs by their patterns and the git repositories by their working trees
+indexes = {}
+name_indexes = {}
+globs = {}
+repositories = {}
+indexes_lock = threading.Lock()
+
+
+def fold_case(name):
+    """Normalize the case of a name the way the file system compares names.
+
+    The file systems of macOS are case-insensitive by default even though
+    os.path.normcase keeps the case there.
+    """
+    if sys.platform == "darwin":
+        return name.lower()
+
+    return os.path.normcase(name)
+
+
+def split_path(path):
+    """Split a relative path into its components for a lookup in the index.
+
+    Returns None if the path contains components that can only be resolved
+    correctly by the file system.
+    """
+    if os.path.altsep:
+        path = path.replace(os.path.altsep, os.path.sep)
+
+    parts = []
+    for part in path.split(os.path.sep):
+        if part in ("", "."):
+            continue
+
+        # the meaning of parent directories depends on symlinks
+        if part == "..":
+            return None
+
+        # Windows silently strips trailing dots and spaces from names and
+        # uses colons for drives and alternate data streams
+        if os.path.sep == "\\" and (part[-1] in ". " or ":" in part):
+            return None
+
+        parts.append(fold_case(part))
+
+    return parts
+
+
+def find_node(tree, parts):
+    """Find the node of some path components (or UNKNOWN or False)."""
+    node = tree
+    for part in parts:
+        if node is UNKNOWN:
+            return UNKNOWN
+        elif node is None:
+            # files don't have any children
+            return False
+
+        node = node.get(part, False)
+        if node is False:
+            return False
+
+    return node
+
+
+def add_path(tree, path, value):
+    """Add a file (None) or an unknown subtree to a tree by its git path."""
+    *dirs, name = [fold_case(part)
+                   for part in path.rstrip("/").split("/")]
+
+    node = tree
+    for part in dirs:
+        child = node.get(part)
+        if child is UNKNOWN:
+            return
+        elif not isinstance(child, dict):
+            child = node[part] = {}
+
+        node = child
+
+    if value is UNKNOWN or name not in node:
+        node[name] = value
+
+
+def is_glob(path):
+    """Whether a path contains wildcards."""
+    return glob_chars.search(path) is not None
+
+
+def split_glob(pattern):
+    """Split a pattern into its directory and the remaining components.
+
+    The directory is everything before the first component with wildcards.
+    """
+    if os.path.altsep:
+        pattern = pattern.replace(os.path.altsep, os.path.sep)
+
+    parts = pattern.split(os.path.sep)
+    i = 0
+    while i < len(parts) and not is_glob(parts[i]):
+        i += 1
+
+    # keep the separator after a drive letter or the root directory
+    root = os.path.sep.join(parts[:i]) + os.path.sep if i > 0 else os.curdir
+    return (os.path.normpath(root),
+            [part for part in parts[i:] if part not in ("", ".")])
+
+
+class DirectoryIndex:
+    """A tree of all paths within a directory."""
+
+    def __init__(self, root, ttl, limit):
+        """Initialize the index."""
+        self.root = root
+        self.ttl = ttl
+        self.limit = limit
+
+        # the tree of path components where directories are dictionaries,
+        # files are None and unknown subtrees are UNKNOWN
+        self.tree = None
+        self.time = 0
+        self.building = False
+        self.lock = threading.Lock()
+
+    def is_ready(self):
+        """Whether the index can answer lookups (and refresh it if not)."""
+        if self.tree is not None and time.monotonic() - self.time < self.ttl:
+            return True
+
+        # build the index in the background and let the file system answer
+        # all lookups until it is ready
+        with self.lock:
+            if not self.building:
+                self.building = True
+                thread = threading.Thread(target=self.build, daemon=True)
+                thread.start()
+
+        return False
+
+    def build(self):
+        """Scan the directory to build a new tree."""
+        start = time.monotonic()
+        tree = {}
+
+        # all directories that are still pending with their parent node
+        pending = {self.root: (None, None, tree)}
+        count = 0
+
+        try:
+            for dirpath, dirnames, filenames in os.walk(self.root):
+                parent, name, node = pending.pop(dirpath, (None, None, None))
+                if node is None:
+                    continue
+
+                for filename in filenames:
+                    node[fold_case(filename)] = None
+
+                # we don't follow symlinks to avoid cycles so their contents
+                # are left to the file system
+                for dirname in list(dirnames):
+                    child = os.path.join(dirpath, dirname)
+                    if os.path.islink(child):
+                        node[fold_case(dirname)] = UNKNOWN
+                        dirnames.remove(dirname)
+                    else:
+                        subtree = {}
+                        node[fold_case(dirname)] = subtree
+                        pending[child] = (node, dirname, subtree)
+
+                count += len(filenames) + len(dirnames)
+                if count > self.limit:
+                    log.info("Directory index limit reached for %s",
+                             self.root)
+                    break
+        except Exception:
+            log.exception("Failed to index %s", self.root)
+
+        # anything we didn't get to is unknown
+        for parent, name, node in pending.values():
+            if parent is None:
+                # the root itself could not be read
+                tree = UNKNOWN if os.path.isdir(self.root) else {}
+            else:
+                parent[fold_case(name)] = UNKNOWN
+
+        log.debug("Indexed %s entries in %s (%.3fs)", count, self.root,
+                  time.monotonic() - start)
+
+        with self.lock:
+            self.tree = tree
+            self.time = time.monotonic()
+            self.building = False
+
+    def find(self, path):
+        """Find the node of a relative path (or UNKNOWN or False)."""
+        if not self.is_ready():
+            return UNKNOWN
+
+        parts = split_path(path)
+        if parts is None:
+            return UNKNOWN
+
+        return find_node(self.tree, parts)
+
+    def exists(self, path):
+        """Check whether a relative path exists according to the index.
+
+        Returns None if the index doesn't know the path.
+        """
+        node = self.find(path)
+        if node is UNKNOWN:
+            return None
+        elif node is False:
+            return False
+
+        # a trailing separator requires the path to be a directory
+        if path.endswith((os.path.sep, os.path.altsep or os.path.sep)) and \
+                node is None:
+            return False
+
+        return True
+
+    def is_dir(self, path):
+        """Whether a relative path is a directory (None if this is unknown)."""
+        node = self.find(path)
+        if node is UNKNOWN or node is False:
+            return None
+
+        return node is not None
+
+    def has_prefix(self, path):
+        """Whether any path starts with a relative path (None if unknown)."""
+        if os.path.altsep:
+            path = path.replace(os.path.altsep, os.path.sep)
+
+        head, sep, tail = path.rpartition(os.path.sep)
+        node = self.find(head + sep)
+        if node is UNKNOWN:
+            return None
+        elif not node:
+            return False
+
+        tail = fold_case(tail)
+        return any(name.startswith(tail) for name in node)
+
+
+class GitRepository:
+    """The files of a git repository according to its index.
+
+    Tracked (and optionally untracked) files are known without the file
+    system. Ignored files and directories (like build outputs) as well as
+    tracked files that were deleted are left to the file system. The files
+    are listed again when the index of the repository changes and after ttl
+    seconds.
+    """
+
+    def __init__(self, worktree, git_dir, ttl, untracked):
+        """Initialize the repository."""
+        self.worktree = worktree
+        self.index_file = os.path.join(git_dir, "index")
+        self.ttl = ttl
+        self.untracked = untracked
+
+        # the tree of all files like in DirectoryIndex (or UNKNOWN if git
+        # failed) and the modification time of the index it was built from
+        self.tree = None
+        self.mtime = None
+
+        self.time = 0
+        self.checked = 0
+        self.building = False
+        self.lock = threading.Lock()
+
+    def is_ready(self):
+        """Whether the files are known (and list them again if they changed).
+
+        The old files are used until the new ones are listed.
+        """
+        now = time.monotonic()
+        if self.tree is not None and now - self.checked < git_check_interval:
+            return True
+
+        self.checked = now
+        try:
+            mtime = get_mtime(self.index_file)
+        except OSError:
+            mtime = None
+
+        if self.tree is None or mtime != self.mtime or \
+                now - self.time >= self.ttl:
+            with self.lock:
+                if not self.building:
+                    self.building = True
+                    thread = threading.Thread(target=self.build, daemon=True)
+                    thread.start()
+
+        return self.tree is not None
+
+    def build(self):
+        """List all files of the repository to build a new tree."""
+        start = time.monotonic()
+        try:
+            mtime = get_mtime(self.index_file)
+        except OSError:
+            mtime = None
+
+        tree = {}
+        try:
+            for record in self.run("--cached", "--stage"):
+                info, tab, path = record.partition("\t")
+
+                # submodules are repositories of their own
+                add_path(tree, path,
+                         UNKNOWN if info.startswith("160000") else None)
+
+            if self.untracked:
+                for path in self.run("--others", "--exclude-standard"):
+                    add_path(tree, path, None)
+
+            for path in self.run("--others", "--ignored", "--exclude-standard",
+                                 "--directory"):
+                add_path(tree, path, UNKNOWN)
+
+            # the index still lists deleted files until their removal is
+            # staged
+            for path in self.run("--deleted"):
+                add_path(tree, path, UNKNOWN)
+        except (OSError, subprocess.CalledProcessError) as error:
+            log.warning("Failed to list the files of %s: %s", self.worktree,
+                        error)
+            tree = UNKNOWN
+
+        log.debug("Listed the files of %s (%.3fs)", self.worktree,
+                  time.monotonic() - start)
+
+        with self.lock:
+            self.tree = tree
+            self.mtime = mtime
+            self.time = time.monotonic()
+            self.building = False
+
+    def run(self, *args):
+        """List some files of the repository with git ls-files."""
+        output = subprocess.check_output(
+            ("git", "ls-files", "-z") + args, cwd=self.worktree,
+            stdin=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            startupinfo=startupinfo)
+
+        return [path for path in output.decode(
+            "utf-8", "surrogateescape").split("\0") if path]
+
+    def find(self, path):
+        """Find the node of a directory within the repository."""
+        if not self.is_ready():
+            return UNKNOWN
+
+        parts = split_path(os.path.relpath(path, self.worktree))
+        if parts is None:
+            return UNKNOWN
+
+        return find_node(self.tree, parts)
+
+
+class GitIndex(DirectoryIndex):
+    """A directory index of a directory within a git repository."""
+
+    def __init__(self, root, repository):
+        """Initialize the index."""
+        self.root = root
+        self.repository = repository
+
+        # the path components of the directory within the repository
+        self.prefix = split_path(os.path.relpath(root, repository.worktree))
+
+    def find(self, path):
+        """Find the node of a relative path (or UNKNOWN or False)."""
+        parts = split_path(path)
+        if self.prefix is None or parts is None or \
+                not self.repository.is_ready():
+            return UNKNOWN
+
+        # without the untracked files a path that isn't tracked might still
+        # exist
+        node = find_node(self.repository.tree, self.prefix + parts)
+        if node is False and not self.repository.untracked:
+            return UNKNOWN
+
+        return node
+
+    def has_prefix(self, path):
+        """Whether any path starts with a relative path (None if unknown)."""
+        found = super().has_prefix(path)
+        if found is False and not self.repository.untracked:
+            return None
+
+        return found
+
+
+class NameIndex:
+    """The paths of all files within some directories by their names.
+
+    Bare file names and partial paths are resolved by looking up their last
+    component and comparing the directories of the candidates with the rest.
+    """
+
+    def __init__(self, roots, ttl, limit, excludes, cache_dir=None,
+                 git=False, untracked=True):
+        """Initialize the index.
+
+        The index is stored in a file within cache_dir (if given) so that only
+        changed directories need to be read again after a restart. With git
+        the files of roots within git repositories are taken from the
+        repositories (including untracked files if untracked is set).
+        """
+        self.roots = roots
+        self.ttl = ttl
+        self.limit = limit
+        self.excludes = excludes
+        self.cache_dir = cache_dir
+        self.git = git
+        self.untracked = untracked
+
+        # all indexed directories and the files with the numbers of their
+        # directories (a single number for unique names and a list otherwise,
+        # which is much smaller than storing a full path for every file)
+        self.dirs = []
+        self.files = {}
+
+        # the sorted names of all files and directories to check for prefixes
+        self.names = None
+
+        # the modification times, subdirectories and files of all indexed
+        # directories by their paths
+        self.listings = None
+
+        # the trees of the git repositories the index was built from
+        self.git_trees = {}
+
+        self.time = 0
+        self.complete = False
+        self.building = False
+        self.lock = threading.Lock()
+
+    def is_ready(self):
+        """Whether the index is complete (and refresh it if it is too old)."""
+        if self.complete and time.monotonic() - self.time < self.ttl and \
+                not self.is_git_changed():
+            return True
+
+        # the first build fills the index while it can already be used, later
+        # ones replace the old index once they are done
+        with self.lock:
+            if not self.building:
+                self.building = True
+                thread = threading.Thread(target=self.build, daemon=True)
+                thread.start()
+
+        return self.complete
+
+    def is_excluded(self, name):
+        """Whether a directory is excluded from the index."""
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.excludes)
+
+    def is_git_changed(self):
+        """Whether the files of any git repository changed since the build."""
+        return any(not repository.is_ready() or repository.tree is not tree
+                   for repository, tree in self.git_trees.items())
+
+    def build(self):
+        """Scan all directories to build a new index."""
+        start = time.monotonic()
+        if self.complete:
+            dirs, files = [], {}
+        else:
+            dirs, files = self.dirs, self.files
+
+        # the contents of unchanged directories can be reused from the last
+        # build or the cache file
+        previous = self.listings
+        if previous is None:
+            previous = self.load()
+
+        listings = {}
+        names = set()
+        git_trees = {}
+        count = 0
+        try:
+            for root in self.roots:
+                # the files of git repositories are known without walking
+                # through all directories
+                node = None
+                repository = get_repository(root, self.ttl, self.untracked) \
+                    if self.git else None
+                if repository is not None:
+                    if repository.tree is None:
+                        repository.build()
+
+                    git_trees[repository] = repository.tree
+                    node = repository.find(root)
+
+                if isinstance(node, dict):
+                    walk = self.walk_tree(root, node)
+                else:
+                    walk = self.walk(root, previous)
+
+                for dirpath, entry in walk:
+                    listings[dirpath] = entry
+                    mtime, dirnames, filenames = entry
+                    names.update(fold_case(dirname)
+                                 for dirname in dirnames)
+
+                    number = len(dirs)
+                    dirs.append(dirpath)
+                    for filename in filenames:
+                        name = fold_case(filename)
+                        names.add(name)
+
+                        entry = files.get(name)
+                        if entry is None:
+                            files[name] = number
+                        elif isinstance(entry, int):
+                            files[name] = [entry, number]
+                        else:
+                            entry.append(number)
+
+                    count += len(filenames)
+                    if count > self.limit:
+                        break
+
+                if count > self.limit:
+                    log.info("Name index limit reached for %s", root)
+                    break
+        except Exception:
+            log.exception("Failed to index %s", self.roots)
+
+        log.debug("Indexed %s files in %s (%.3fs)", count, self.roots,
+                  time.monotonic() - start)
+
+        if listings != previous:
+            self.save(listings)
+
+        with self.lock:
+            self.dirs = dirs
+            self.files = files
+            self.names = tuple(sorted(names))
+            self.listings = listings
+            self.git_trees = git_trees
+            self.time = time.monotonic()
+            self.complete = True
+            self.building = False
+
+    def walk(self, root, previous):
+        """Walk through a directory and yield the listings of all directories.
+
+        Directories whose modification time didn't change since the previous
+        listings are not read again.
+        """
+        pending = [root]
+        while pending:
+            dirpath = pending.pop()
+            try:
+                mtime = get_mtime(dirpath)
+            except OSError:
+                continue
+
+            entry = previous.get(dirpath)
+            if entry is None or entry[0] != mtime:
+                try:
+                    dirnames, filenames = list_directory(dirpath)
+                except OSError:
+                    continue
+
+                # we don't follow symlinks to avoid cycles
+                dirnames = [dirname for dirname in dirnames
+                            if not self.is_excluded(dirname)]
+                dirnames = [dirname for dirname in dirnames
+                            if not os.path.islink(
+                                os.path.join(dirpath, dirname))]
+                entry = (mtime, dirnames, filenames)
+
+            yield dirpath, entry
+
+            pending.extend(os.path.join(dirpath, dirname)
+                           for dirname in reversed(entry[1]))
+
+    def walk_tree(self, root, tree):
+        """Walk through a tree and yield the listings of all directories.
+
+        Unknown subtrees (like ignored directories) are skipped.
+        """
+        pending = [(root, tree)]
+        while pending:
+            dirpath, node = pending.pop()
+            dirnames = [name for name, child in node.items()
+                        if isinstance(child, dict)]
+            dirnames = sorted(name for name in dirnames
+                              if not self.is_excluded(name))
+            filenames = [name for name, child in node.items() if child is None]
+
+            yield dirpath, (0, dirnames, filenames)
+
+            pending.extend((os.path.join(dirpath, dirname), node[dirname])
+                           for dirname in reversed(dirnames))
+
+    def get_cache_file(self):
+        """Get the path of the file the index is stored in (or None)."""
+        if not self.cache_dir:
+            return None
+
+        key = json.dumps([self.roots, self.limit, self.excludes])
+        name = hashlib.md5(key.encode("utf-8", "surrogateescape")).hexdigest()
+        return os.path.join(self.cache_dir, "names-" + name)
+
+    def get_header(self):
+        """Get the first line of the cache file."""
+        header = json.dumps([cache_version, self.roots, self.limit,
+                             self.excludes])
+        return header.encode("utf-8", "surrogateescape") + b"\n"
+
+    def load(self):
+        """Load the directory listings from the cache file.
+
+        Each listing is stored as the modification time, path, number of
+        subdirectories and the names of all entries separated by null bytes
+        with two null bytes after each listing.
+        """
+        cache_file = self.get_cache_file()
+        listings = {}
+        if cache_file is None or not os.path.isfile(cache_file):
+            return listings
+
+        header = self.get_header()
+        try:
+            # the mapping stays valid after the file is closed
+            with open(cache_file, "rb") as file:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+            with data:
+                if data[:len(header)] != header:
+                    return listings
+
+                start = len(header)
+                while start < len(data):
+                    end = data.find(b"\0\0", start)
+                    if end < 0:
+                        end = len(data)
+
+                    fields = data[start:end].decode(
+                        "utf-8", "surrogateescape").split("\0")
+                    count = int(fields[2]) + 3
+                    listings[fields[1]] = (
+                        int(fields[0]), fields[3:count], fields[count:])
+                    start = end + 2
+        except (OSError, ValueError, IndexError) as error:
+            log.warning("Failed to load the name index %s: %s", cache_file,
+                        error)
+            return {}
+
+        log.debug("Loaded %s directories from %s", len(listings), cache_file)
+        return listings
+
+    def save(self, listings):
+        """Store the directory listings in the cache file."""
+        cache_file = self.get_cache_file()
+        if cache_file is None:
+            return
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            # replace the old file at once so it is never read half-written
+            temp_file = cache_file + ".tmp"
+            with open(temp_file, "wb") as file:
+                file.write(self.get_header())
+                for dirpath, (mtime, dirnames, filenames) in listings.items():
+                    fields = [str(mtime), dirpath, str(len(dirnames))]
+                    fields += dirnames
+                    fields += filenames
+                    file.write("\0".join(fields).encode(
+                        "utf-8", "surrogateescape") + b"\0\0")
+
+            os.replace(temp_file, cache_file)
+        except OSError as error:
+            log.warning("Failed to save the name index %s: %s", cache_file,
+                        error)
+
+    def find(self, path):
+        """Find all files whose paths end with a relative path."""
+        self.is_ready()
+
+        parts = split_path(path)
+        if not parts or path.endswith(
+                (os.path.sep, os.path.altsep or os.path.sep)):
+            return []
+
+        dirs = self.dirs
+        entry = self.files.get(parts[-1])
+        if entry is None:
+            return []
+        elif isinstance(entry, int):
+            numbers = [entry]
+        else:
+            numbers = list(entry)
+
+        # the directories of the candidates must end with all other parts
+        suffix = os.path.sep + os.path.join(*parts[:-1]) if parts[:-1] else ""
+
+        paths = []
+        for number in numbers:
+            dir = dirs[number]
+            if fold_case(dir).endswith(suffix):
+                paths.append(os.path.join(dir, parts[-1]))
+
+        return paths
+
+    def has_prefix(self, name):
+        """Whether any file or directory name starts with a prefix.
+
+        Returns None if the index isn't complete yet.
+        """
+        names = self.names
+        if names is None:
+            return None
+
+        name = fold_case(name)
+        i = bisect.bisect_left(names, name)
+        return i < len(names) and names[i].startswith(name)
+
+
+class DirectoryGlob:
+    """All directories matching a pattern.
+
+    The components of the pattern can contain the wildcards of fnmatch and
+    "**" matches any number of nested directories. The matches are found in
+    the background and refreshed after ttl seconds, which only reads the
+    directories whose modification time changed since.
+    """
+
+    def __init__(self, pattern, ttl, limit, excludes):
+        """Initialize the glob."""
+        self.pattern = pattern
+        self.ttl = ttl
+        self.limit = limit
+        self.excludes = excludes
+        self.root, self.parts = split_glob(pattern)
+
+        # the matching directories as well as the modification times,
+        # subdirectories and symlinks to directories of all directories that
+        # were read by their paths
+        self.dirs = None
+        self.listings = {}
+
+        self.time = 0
+        self.building = False
+        self.lock = threading.Lock()
+
+    def get(self, wait=False):
+        """Get the matching directories (and refresh them if they are old).
+
+        Until the first matches are found there are none unless wait is set.
+        """
+        if self.dirs is None and wait:
+            self.build()
+        elif self.dirs is None or time.monotonic() - self.time >= self.ttl:
+            with self.lock:
+                if not self.building:
+                    self.building = True
+                    thread = threading.Thread(target=self.build, daemon=True)
+                    thread.start()
+
+        return self.dirs or ()
+
+    def is_excluded(self, name):
+        """Whether a directory is skipped by "**"."""
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.excludes)
+
+    def build(self):
+        """Find all matching directories again."""
+        global glob_generation
+
+        start = time.monotonic()
+        listings = {}
+        matches = []
+        try:
+            self.match(self.root, 0, listings, matches, set())
+        except Exception:
+            log.exception("Failed to expand %s", self.pattern)
+
+        if len(listings) >= self.limit:
+            log.info("Directory limit reached for %s", self.pattern)
+
+        # keep the order of the matches but list each directory only once
+        dirs = tuple(OrderedDict.fromkeys(matches))
+
+        log.debug("Expanded %s to %s directories (%.3fs)", self.pattern,
+                  len(dirs), time.monotonic() - start)
+
+        with self.lock:
+            if dirs != (self.dirs or ()):
+                glob_generation += 1
+
+            self.dirs = dirs
+            self.listings = listings
+            self.time = time.monotonic()
+            self.building = False
+
+    def match(self, dirpath, i, listings, matches, visited):
+        """Find the matches of the components from i on within a directory."""
+        if i == len(self.parts):
+            matches.append(dirpath)
+            return
+
+        # "**" can reach the same directory in multiple ways
+        if (dirpath, i) in visited:
+            return
+        visited.add((dirpath, i))
+
+        part = self.parts[i]
+        if part == "**":
+            # match no directory at all or descend one level further (without
+            # following symlinks to avoid cycles)
+            self.match(dirpath, i + 1, listings, matches, visited)
+            dirnames, links = self.list(dirpath, listings)
+            for dirname in dirnames:
+                if dirname not in links and not self.is_excluded(dirname):
+                    self.match(os.path.join(dirpath, dirname), i, listings,
+                               matches, visited)
+        elif not is_glob(part):
+            # names without wildcards don't need a listing
+            path = os.path.join(dirpath, part)
+            if os.path.isdir(path):
+                self.match(path, i + 1, listings, matches, visited)
+        else:
+            dirnames, links = self.list(dirpath, listings)
+            for dirname in dirnames:
+                if fnmatch.fnmatch(dirname, part):
+                    self.match(os.path.join(dirpath, dirname), i + 1,
+                               listings, matches, visited)
+
+    def list(self, dirpath, listings):
+        """List the subdirectories and symlinks to directories of a directory.
+
+        The previous listing is reused if the directory didn't change.
+        """
+        entry = listings.get(dirpath)
+        if entry is not None:
+            return entry[1:]
+
+        if len(listings) >= self.limit:
+            return [], set()
+
+        try:
+            mtime = get_mtime(dirpath)
+        except OSError:
+            return [], set()
+
+        entry = self.listings.get(dirpath)
+        if entry is None or entry[0] != mtime:
+            try:
+                dirnames, filenames = list_directory(dirpath)
+            except OSError:
+                dirnames = []
+
+            dirnames.sort()
+            links = set(dirname for dirname in dirnames
+                        if os.path.islink(os.path.join(dirpath, dirname)))
+            entry = (mtime, dirnames, links)
+
+        listings[dirpath] = entry
+        return entry[1:]
+
+
+def get_indexes(dirs, ttl, limit):
+    """Get the indexes for the given directories."""
+    with indexes_lock:
+        result = {}
+        for dir in dirs:
+            index = indexes.get(dir)
+            if index is None or index.ttl != ttl or index.limit != limit:
+                index = DirectoryIndex(dir, ttl, limit)
+                indexes[dir] = index
+
+            result[dir] = index
+
+        return result
+
+
+def find_worktree(path):
+    """Find the working tree and git directory containing a path (or None)."""
+    path = os.path.abspath(path)
+    while True:
+        git_dir = os.path.join(path, ".git")
+        if os.path.isdir(git_dir):
+            return path, git_dir
+
+        # the .git file of linked working trees and submodules points to the
+        # actual git directory
+        if os.path.isfile(git_dir):
+            try:
+                with open(git_dir) as file:
+                    line = file.readline()
+            except OSError:
+                return None
+
+            if not line.startswith("gitdir:"):
+                return None
+
+            return path, os.path.join(path, line[len("gitdir:"):].strip())
+
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+
+        path = parent
+
+
+def get_repository(path, ttl, untracked):
+    """Get the git repository containing a path (or None)."""
+    found = find_worktree(path)
+    if found is None:
+        return None
+
+    worktree, git_dir = found
+    with indexes_lock:
+        repository = repositories.get(worktree)
+        if repository is None or repository.ttl != ttl or \
+                repository.untracked != untracked:
+            repository = GitRepository(worktree, git_dir, ttl, untracked)
+            repositories[worktree] = repository
+
+        return repository
+
+
+def get_git_indexes(dirs, ttl, untracked):
+    """Get the indexes for all directories within git repositories."""
+    result = {}
+    for dir in dirs:
+        repository = get_repository(dir, ttl, untracked)
+        if repository is not None:
+            result[dir] = GitIndex(dir, repository)
+
+    return result
+
+
+def get_mtime(path):
+    """Get the modification time of a path in nanoseconds."""
+    return os.stat(path).st_mtime_ns
+
+
+def list_directory(path):
+    """List the names of the subdirectories and files of a directory."""
+    dirnames, filenames = [], []
+    if hasattr(os, "scandir"):
+        # the types of the entries are usually known without a stat call
+        for entry in os.scandir(path):
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+
+            (dirnames if is_dir else filenames).append(entry.name)
+    else:
+        for name in os.listdir(path):
+            is_dir = os.path.isdir(os.path.join(path, name))
+            (dirnames if is_dir else filenames).append(name)
+
+    return dirnames, filenames
+
+
+def get_name_index(roots, ttl, limit, excludes, cache_dir=None, git=False,
+                   untracked=True):
+    """Get the name index for the given root directories."""
+
+    # directories within other roots would be indexed twice
+    paths = [os.path.join(fold_case(os.path.normpath(root)), "")
+             for root in roots]
+    roots = tuple(
+        root for i, (root, path) in enumerate(zip(roots, paths))
+        if not any(path.startswith(other) and (path != other or j < i)
+                   for j, other in enumerate(paths)))
+
+    with indexes_lock:
+        name_index = name_indexes.get(roots)
+        if name_index is None or name_index.ttl != ttl or \
+                name_index.limit != limit or \
+                name_index.excludes != excludes or name_index.git != git or \
+                name_index.untracked != untracked:
+            name_index = NameIndex(roots, ttl, limit, excludes, cache_dir, git,
+                                   untracked)
+            name_indexes[roots] = name_index
+
+        return name_index
+
+
+def expand_directories(dirs, ttl, limit, excludes, wait=False):
+    """Replace all patterns within a list of directories by their matches.
+
+    Patterns whose matches aren't known yet are skipped unless wait is set.
+    """
+    result = []
+    for dir in dirs:
+        if not is_glob(dir):
+            result.append(dir)
+            continue
+
+        with indexes_lock:
+            glob = globs.get(dir)
+            if glob is None or glob.ttl != ttl or glob.limit != limit or \
+                    glob.excludes != excludes:
+                glob = DirectoryGlob(dir, ttl, limit, excludes)
+                globs[dir] = glob
+
+        result.extend(glob.get(wait))
+
+    # search each directory only once
+    return tuple(OrderedDict.fromkeys(result))
+
+
+def check_globs():
+    """Refresh the matches of all old globs in the background.
+
+    Returns the current generation of the matches.
+    """
+    with indexes_lock:
+        current = list(globs.values())
+
+    for glob in current:
+        glob.get()
+
+    return glob_generation
+
+
+def clear():
+    """Forget all indexes."""
+    with indexes_lock:
+        indexes.clear()
+        name_indexes.clear()
+        globs.clear()
+        repositories.clear()
@@ -0,0 +1,111 @@
+"""Collect timings and counters of the path detection."""
+
+import threading
+import time
+
+
+# the phases of finding and opening paths in the order they are shown
+phases = ["settings", "tokenize", "search", "stat", "listdir", "match", "open"]
+
+
+class Timer:
+    """Measure the time of a block and add it to a phase."""
+
+    __slots__ = ["metrics", "phase", "start"]
+
+    def __init__(self, metrics, phase):
+        """Initialize the timer."""
+        self.metrics = metrics
+        self.phase = phase
+
+    def __enter__(self):
+        """Start the timer."""
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        """Add the elapsed time to the phase."""
+        self.metrics.add(self.phase, time.perf_counter() - self.start)
+
+
+class Metrics:
+    """The timings of all phases in total and of the last invocation.
+
+    The last invocation only includes the timings measured in the thread that
+    began it, so searches in the background don't overwrite it.
+    """
+
+    def __init__(self):
+        """Initialize the metrics."""
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget all timings."""
+        with self.lock:
+            # the number of calls, total and maximum time by phase
+            self.total = {}
+
+            # the number of calls and total time by phase since begin and
+            # the id of the thread that called it
+            self.last = {}
+            self.thread = None
+
+    def begin(self):
+        """Start a new invocation in the current thread."""
+        with self.lock:
+            self.last = {}
+            self.thread = threading.get_ident()
+
+    def timer(self, phase):
+        """Measure the time of a block (use with a with statement)."""
+        return Timer(self, phase)
+
+    def add(self, phase, elapsed):
+        """Add the time of a single call to a phase."""
+        with self.lock:
+            stats = self.total.get(phase)
+            if stats is None:
+                stats = self.total[phase] = [0, 0.0, 0.0]
+
+            stats[0] += 1
+            stats[1] += elapsed
+            if elapsed > stats[2]:
+                stats[2] = elapsed
+
+            if threading.get_ident() != self.thread:
+                return
+
+            last = self.last.get(phase)
+            if last is None:
+                last = self.last[phase] = [0, 0.0]
+
+            last[0] += 1
+            last[1] += elapsed
+
+    def summary(self, caches):
+        """Summarize the timings and the counters of some named caches."""
+        lines = ["{:<10} {:>8} {:>11} {:>10} {:>10} {:>10}".format(
+            "Phase", "Calls", "Total ms", "Mean ms", "Max ms", "Last ms")]
+
+        with self.lock:
+            for phase in phases:
+                calls, total, maximum = self.total.get(phase, (0, 0.0, 0.0))
+                last = self.last.get(phase, (0, 0.0))[1]
+                lines.append(
+                    "{:<10} {:>8} {:>11.2f} {:>10.3f} {:>10.3f} {:>10.3f}"
+                    .format(phase, calls, total * 1000,
+                            total * 1000 / calls if calls else 0,
+                            maximum * 1000, last * 1000))
+
+        lines.append("")
+        lines.append("{:<10} {:>8} {:>11} {:>10} {:>10}".format(
+            "Cache", "Hits", "Misses", "Ratio", "Entries"))
+
+        for name, cache in sorted(caches.items()):
+            lookups = cache.hits + cache.misses
+            lines.append("{:<10} {:>8} {:>11} {:>10.1%} {:>10}".format(
+                name, cache.hits, cache.misses,
+                cache.hits / lookups if lookups else 0, len(cache.entries)))
+
+        return "\n".join(lines)
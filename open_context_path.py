@@ -1,35 +1,208 @@
 """Open file paths at the current cursor position."""
 
-import functools
 import logging
 import os
 import re
-from itertools import chain
+import time
+from collections import OrderedDict
 
 import sublime
 import sublime_plugin
 
+from . import archives
+from . import cache
+from . import core
+from . import index
+from . import prefetch
+from . import probing
+from .core import (
+    Settings, listing_cache, prefix_cache, prober, search_cache, stat_cache,
+    stats)
+from .patterns import PatternMatcher
+
 
 platform = sublime.platform()
 log = logging.getLogger("OpenContextPath")
 
+# the number of seconds a found result can be reused for an identical query
+result_timeout = 1.0
+
+# reads the files that are probably opened next (see prefetch_path)
+prefetcher = prefetch.Prefetcher()
+
+# incremented whenever the settings change to invalidate any reused results
+settings_generation = 0
+
+# the paths found within the lines of each view by the id of the view and the
+# ids of the output panels whose paths are found while text is appended (see
+# output.py)
+span_caches = {}
+streamed_views = set()
+
+# the settings snapshots by the ids of the view and the window's active view
+# (see OpenContextPathCommand.get_settings)
+settings_snapshots = {}
+
+# the ids of all views whose settings we are watching
+watched_views = set()
+
+# the characters that are usually part of a path (including spaces)
+path_chars = re.compile(r"[^\t\"'<>|;=(){}\[\],]*")
+
+
+def update_settings():
+    """Invalidate everything that depends on the current settings."""
+    global settings_generation
+    settings_generation += 1
+    settings_snapshots.clear()
+
+    settings = sublime.load_settings("OpenContextPath.sublime-settings")
+    size = settings.get("cache_size", 10000)
+    ttl = settings.get("cache_ttl", 10)
+    stat_cache.configure(size, ttl)
+    listing_cache.configure(size // 10, ttl)
+    search_cache.configure(size, ttl)
+    prefix_cache.configure(size, ttl)
+    clear_caches()
+
+
+def clear_caches():
+    """Forget about the results of all file system lookups."""
+    core.clear_caches()
+    span_caches.clear()
+
+
+def get_span_cache(view):
+    """Get the cache of the paths found within the lines of a view."""
+    span_cache = span_caches.get(view.id())
+    if span_cache is None:
+        span_cache = cache.TimedCache(size=stat_cache.size // 10,
+                                      ttl=stat_cache.ttl)
+        span_caches[view.id()] = span_cache
+
+    return span_cache
+
+
+def forget_settings(view):
+    """Forget about the settings snapshots that depend on a view."""
+    for key in list(settings_snapshots):
+        if view.id() in key:
+            settings_snapshots.pop(key, None)
+
+
+def plugin_loaded():
+    """Initialize the plugin."""
+    update_settings()
+
+    # track any changes to the settings
+    settings = sublime.load_settings("OpenContextPath.sublime-settings")
+    settings.add_on_change("open_context_path", update_settings)
+
+
+def plugin_unloaded():
+    """Clean up."""
+
+    # remove our settings handlers
+    settings = sublime.load_settings("OpenContextPath.sublime-settings")
+    settings.clear_on_change("open_context_path")
+
+    for window in sublime.windows():
+        for view in window.views():
+            if view.id() in watched_views:
+                view.settings().clear_on_change("open_context_path")
+
+    prober.shutdown()
+    prefetcher.shutdown()
+
+
+def watch_view_settings(view):
+    """Update the settings when the view's settings change."""
+    if view.id() in watched_views:
+        return
+
+    watched_views.add(view.id())
+
+    # the callback is called for any changed setting of the view so we need to
+    # check if it was actually one of ours
+    settings = view.settings()
+    current = [settings.get("open_context_path")]
+
+    def on_change():
+        new = settings.get("open_context_path")
+        if new != current[0]:
+            current[0] = new
+            update_settings()
+
+    settings.add_on_change("open_context_path", on_change)
+
+
+class OpenContextPathListener(sublime_plugin.EventListener):
+    """Invalidate cached lookups when files, folders or projects change."""
+
+    # the window commands that change the folders of a window
+    folder_commands = [
+        "prompt_add_folder", "remove_folder", "refresh_folder_list"
+    ]
+
+    def on_post_save(self, view):
+        """Forget about the settings of a saved view.
 
-class OpenContextPathCommand(sublime_plugin.TextCommand):
+        The directories can contain variables like ${file_path}, which change
+        when a view is saved under a new name.
+        """
+        forget_settings(view)
+
+    def on_post_save_async(self, view):
+        """Forget about cached lookups when a file was saved."""
+        clear_caches()
+
+    def on_post_window_command(self, window, command_name, args):
+        """Update the settings when the folders changed."""
+        if command_name in self.folder_commands:
+            update_settings()
+
+    def on_load_project_async(self, window):
+        """Update the settings when a project was loaded."""
+        update_settings()
+
+    def on_post_save_project_async(self, window):
+        """Update the settings when a project was saved."""
+        update_settings()
+
+    def on_modified(self, view):
+        """Forget about the paths found within a modified view."""
+
+        # text is only appended to streamed output panels
+        if view.id() not in streamed_views:
+            span_caches.pop(view.id(), None)
+
+    def on_close(self, view):
+        """Forget about the settings and paths of closed views."""
+        watched_views.discard(view.id())
+        streamed_views.discard(view.id())
+        span_caches.pop(view.id(), None)
+        forget_settings(view)
+
+
+class OpenContextPathCommand(core.PathFinder, sublime_plugin.TextCommand):
     """Open file paths at the current cursor position."""
 
-    # the regex to split a text into individual parts of a possible path
-    file_parts_unix = re.compile(
-        r"((\w+|\.\.?)/*|\W)", re.IGNORECASE)
-    file_parts_win = re.compile(
-        r"([A-Z]:[/\\]+|(\w+|\.\.?)[/\\]*|\W)", re.IGNORECASE)
+    # the key, time and paths of the last query and whether they were shown
+    # in the context menu (see find_paths)
+    last_result = (None, 0, [], False)
 
-    file_parts = (file_parts_unix if platform != "windows" else file_parts_win)
+    # the number of paths to open at once and the milliseconds to wait in
+    # between (see open_paths)
+    open_chunk_size = 10
+    open_interval = 50
 
     def run(self, edit, event=None):
         """Run the command."""
         paths = self.find_paths(event)
-        for path, info in paths:
-            self.open_path(path, info)
+        self.open_paths([(path, info) for path, info in paths
+                         if not info.get("alternatives")])
+        self.choose_paths([info for path, info in paths
+                           if info.get("alternatives")])
 
     def is_enabled(self, event=None):
         """Whether the command is enabled."""
@@ -38,19 +211,22 @@ class OpenContextPathCommand(sublime_plugin.TextCommand):
 
     def is_visible(self, event=None):
         """Whether the context menu entry is visible."""
-        paths = self.find_paths(event)
+        paths = self.find_paths(event, in_menu=True)
         return len(paths) > 0
 
     def description(self, event=None):
         """Describe the context menu entry."""
-        paths = self.find_paths(event)
+        paths = self.find_paths(event, in_menu=True)
         if paths:
             # only show the name of the first found path
             path, info = paths[0]
             desc = "Open " + os.path.basename(os.path.normpath(path))
             if info.get("line"):
                 desc += " at line {}".format(info["line"])
+            if info.get("alternatives"):
+                desc += " ({} matches)".format(len(info["alternatives"]))
 
+            self.prefetch_path(path, info)
             return desc
 
         return ""
@@ -60,33 +236,123 @@ class OpenContextPathCommand(sublime_plugin.TextCommand):
         return True
 
     def open_path(self, path, info):
-        """Open a file in Sublime Text or a directory with the file manager."""
-        window = self.view.window()
+        """Open a file in Sublime Text or a directory with the file manager.
+
+        The members of archives are extracted in the background and opened
+        from the extracted copy.
+        """
 
         # normalize the path to adjust it to the system
         path = os.path.normpath(path)
 
-        if os.path.isdir(path):
-            log.debug("Opening directory: %s", path)
-            window.run_command("open_dir", {
-                "dir": path
-            })
+        # the path was usually classified while it was found
+        is_dir = info.get("is_dir")
+
+        if not is_dir and archives.is_member_path(path) and \
+                self.get_setting("search_archives", False):
+            def extract():
+                extracted = archives.extract(path)
+                if extracted is None:
+                    sublime.set_timeout(
+                        lambda: self.show_path(path, info, is_dir), 0)
+                else:
+                    sublime.set_timeout(
+                        lambda: self.show_path(extracted, info, False), 0)
+
+            sublime.set_timeout_async(extract, 0)
         else:
-            if platform == "windows":
-                # Sublime Text has trouble opening Windows paths without a
-                # drive letter. We use abspath to fix that.
-                drive, tail = os.path.splitdrive(path)
-                if not drive:
-                    path = os.path.abspath(path)
-
-            # encode line and column numbers into the file path
-            if info.get("line"):
-                path += ":{}".format(info["line"])
-                if info.get("col"):
-                    path += ":{}".format(info["col"])
+            self.show_path(path, info, is_dir)
+
+    def show_path(self, path, info, is_dir):
+        """Open a path that is known to be a directory or not (or None)."""
+        with stats.timer("open"):
+            window = self.view.window()
+            if is_dir is None:
+                is_dir = os.path.isdir(path)
+
+            if is_dir:
+                log.debug("Opening directory: %s", path)
+                window.run_command("open_dir", {
+                    "dir": path
+                })
+            else:
+                if platform == "windows":
+                    # Sublime Text has trouble opening Windows paths without a
+                    # drive letter. We use abspath to fix that.
+                    drive, tail = os.path.splitdrive(path)
+                    if not drive:
+                        path = os.path.abspath(path)
+
+                # encode line and column numbers into the file path
+                if info.get("line"):
+                    path += ":{}".format(info["line"])
+                    if info.get("col"):
+                        path += ":{}".format(info["col"])
+
+                log.debug("Opening file: %s", path)
+                window.open_file(path, sublime.ENCODED_POSITION)
+
+    def prefetch_path(self, path, info):
+        """Read a file that is probably opened next ahead of time.
+
+        The context menu is shown for a while before the path is opened, so
+        the file is read into the page cache of the system in the meantime.
+        """
+        limit = self.get_setting("prefetch_limit", 0)
+        if limit > 0 and not info.get("is_dir") and \
+                not info.get("alternatives"):
+            prefetcher.prefetch(os.path.normpath(path), limit * 1024 * 1024)
+
+    def open_paths(self, paths):
+        """Open many paths without blocking Sublime Text.
+
+        Each path is opened only once at the first position it was found at.
+        The paths are opened in small chunks and the user has to confirm
+        opening more than confirm_open_count paths.
+        """
+        unique = OrderedDict()
+        for path, info in paths:
+            unique.setdefault(os.path.normpath(path), info)
+        paths = list(unique.items())
 
-            log.debug("Opening file: %s", path)
-            window.open_file(path, sublime.ENCODED_POSITION)
+        limit = self.get_setting("confirm_open_count", 0)
+        if limit and len(paths) > limit and not sublime.ok_cancel_dialog(
+                "Open {} paths?".format(len(paths)), "Open"):
+            return
+
+        def open_chunk(begin):
+            end = begin + self.open_chunk_size
+            for path, info in paths[begin:end]:
+                self.open_path(path, info)
+
+            if end < len(paths):
+                sublime.set_timeout(lambda: open_chunk(end),
+                                    self.open_interval)
+
+        open_chunk(0)
+
+    def choose_paths(self, infos):
+        """Let the user choose which of multiple paths to open for each info.
+
+        Only one quick panel can be shown at a time, so the panel for the next
+        info is shown once the last one was closed.
+        """
+        if not infos:
+            return
+
+        paths = infos[0]["alternatives"]
+        items = [[os.path.basename(path), path] for path in paths]
+
+        # the name index only contains files
+        info = dict(infos[0], is_dir=False)
+
+        def on_select(i):
+            if i >= 0:
+                self.open_path(paths[i], info)
+
+            sublime.set_timeout(lambda: self.choose_paths(infos[1:]), 0)
+
+        self.view.window().show_quick_panel(items, on_select)
 
     def get_view_settings(self):
         """Find the settings for the current view."""
@@ -100,6 +366,59 @@ class OpenContextPathCommand(sublime_plugin.TextCommand):
 
         return settings
 
+    def get_settings(self):
+        """Get a snapshot of the current settings for the view.
+
+        The snapshot is only created again after the global or view settings
+        or the directories matching the patterns within them have changed.
+        """
+        view = self.view
+        active_view = view.window().active_view()
+
+        # the settings of a view can depend on the window's active view (see
+        # get_view_settings)
+        key = (view.id(), active_view.id() if active_view else None)
+        generation, snapshot = settings_snapshots.get(key, (None, None))
+        if snapshot is not None and generation != index.check_globs():
+            # the directories matching the patterns changed
+            update_settings()
+            snapshot = None
+
+        if snapshot is None:
+            watch_view_settings(view)
+            if active_view:
+                watch_view_settings(active_view)
+
+            dirs = self.get_directories()
+            context = self.get_context()
+            snapshot = Settings(
+                context=context,
+                max_context=max(self.get_setting("max_context", 4096),
+                                context),
+                directories=dirs,
+                patterns=PatternMatcher(self.get_patterns()),
+                indexes=self.get_indexes(dirs),
+                names=self.get_name_index(dirs),
+                timeout=self.get_setting("probe_timeout", 0) / 1000,
+                archives=self.get_setting("search_archives", False))
+
+            log.debug("Settings: %s", snapshot)
+            settings_snapshots[key] = (index.glob_generation, snapshot)
+
+        return snapshot
+
+    def get_setting(self, name, default):
+        """Get a setting from the view or the global settings."""
+        settings = sublime.load_settings("OpenContextPath.sublime-settings")
+        view_settings = self.get_view_settings()
+
+        # give the view settings precedence over the global settings
+        value = view_settings.get(name, None)
+        if value is None:
+            value = settings.get(name, default)
+
+        return value
+
     def get_context(self):
         """Return the current context setting."""
         settings = sublime.load_settings("OpenContextPath.sublime-settings")
@@ -137,8 +456,15 @@ class OpenContextPathCommand(sublime_plugin.TextCommand):
             project_path = os.path.dirname(project)
             dirs = [os.path.join(project_path, dir) for dir in dirs]
 
-        # return a tuple because lists are not hashable and don't work with the
-        # cache
+        # replace the patterns by all matching directories
+        preferences = sublime.load_settings("Preferences.sublime-settings")
+        dirs = index.expand_directories(
+            dirs, settings.get("index_ttl", 60),
+            settings.get("index_limit", 100000),
+            preferences.get("folder_exclude_patterns", []))
+
+        # the directories are part of the keys of the search and prefix
+        # caches, so they have to be hashable
         return tuple(dirs)
 
     def get_patterns(self):
@@ -152,8 +478,52 @@ class OpenContextPathCommand(sublime_plugin.TextCommand):
 
         return patterns
 
-    def find_paths(self, event=None):
-        """Find file paths at the position where the command was called."""
+    def get_indexes(self, dirs):
+        """Get the indexes for a list of directories if they are enabled."""
+        settings = sublime.load_settings("OpenContextPath.sublime-settings")
+        ttl = settings.get("index_ttl", 60)
+
+        indexes = {}
+        if self.get_setting("index_directories", False):
+            limit = settings.get("index_limit", 100000)
+            indexes.update(index.get_indexes(dirs, ttl, limit))
+
+        # the files of git repositories are known from their index
+        if self.get_setting("index_git", False):
+            untracked = self.get_setting("index_git_untracked", True)
+            indexes.update(index.get_git_indexes(dirs, ttl, untracked))
+
+        return indexes
+
+    def get_name_index(self, dirs):
+        """Get the index of all file names if it is enabled."""
+        if not self.get_setting("index_names", False):
+            return None
+
+        settings = sublime.load_settings("OpenContextPath.sublime-settings")
+        preferences = sublime.load_settings("Preferences.sublime-settings")
+
+        # index the project folders as well as the directories
+        roots = self.view.window().folders() + list(dirs)
+
+        ttl = settings.get("index_ttl", 60)
+        limit = settings.get("name_index_limit", 1000000)
+        excludes = preferences.get("folder_exclude_patterns", [])
+
+        # take the files of git repositories from their index
+        git = self.get_setting("index_git", False)
+        untracked = self.get_setting("index_git_untracked", True)
+
+        # keep the index across restarts
+        cache_dir = os.path.join(sublime.cache_path(), "OpenContextPath")
+        return index.get_name_index(roots, ttl, limit, excludes, cache_dir,
+                                    git, untracked)
+
+    def find_paths(self, event=None, in_menu=False):
+        """Find file paths at the position where the command was called.
+
+        Set in_menu if the paths are shown in the context menu.
+        """
         view = self.view
 
         if event:
@@ -163,142 +533,367 @@ class OpenContextPathCommand(sublime_plugin.TextCommand):
             # search the texts around all selections
             points = [sel.a for sel in view.sel()]
 
-        return self.find_paths_at(points)
+        # the context menu calls is_visible, is_enabled, description and run
+        # in quick succession, so we reuse the result of an identical query
+        # instead of searching for the same paths four times
+        key = (view.id(), view.change_count(), tuple(points),
+               settings_generation)
+        last_key, last_time, last_paths, last_in_menu = self.last_result
+        now = time.monotonic()
+
+        # with prefetching a result shown in the menu is kept for run as long
+        # as the menu might be shown (which is as stale as the cache can be
+        # anyway)
+        timeout = result_timeout
+        if last_in_menu and self.get_setting("prefetch_limit", 0) > 0:
+            timeout = max(timeout, self.get_setting("cache_ttl", 10))
+
+        if key == last_key and now - last_time < timeout:
+            if in_menu and not last_in_menu:
+                self.last_result = (last_key, last_time, last_paths, True)
+            return last_paths
+
+        paths = self.find_paths_at(points)
+        self.last_result = (key, now, paths, in_menu)
+
+        return paths
 
     def find_paths_at(self, points):
         """Find file paths at the given text positions."""
         view = self.view
-        context = self.get_context()
 
-        # get the current list of directories to search
-        dirs = self.get_directories()
+        stats.begin()
+        with stats.timer("settings"):
+            settings = self.get_settings()
+        context = settings.context
 
-        # search for a path around each of the points
+        # get the current list of directories to search
+        dirs = settings.directories
+        self.use_settings(settings)
+
+        # the whole command has to finish within the time limit
+        if self.timeout is not None:
+            self.deadline = probing.Deadline(self.timeout)
+
+        results = {}
+        texts = {}
+        for line, group in self.group_lines(points):
+            # short lines are searched as a whole once and the paths at all
+            # positions within them are remembered
+            if line.size() <= 2 * context:
+                spans = self.get_spans(line, settings, texts)
+                for pt in group:
+                    result = self.find_span(spans, pt - line.a)
+                    if result is not None:
+                        results[pt] = result
+
+                continue
+
+            # search all points within the same part of a long line with a
+            # single scan of the text
+            for begin, end, subgroup in self.group_points(line, group,
+                                                          context):
+                begin, upper = self.grow_window(line, begin, subgroup,
+                                                settings.max_context)
+
+                # the text is grown to the right as long as a path reaches
+                # its end
+                while True:
+                    text = view.substr(sublime.Region(begin, end))
+                    scan = self.scan_text(text, dirs)
+                    found = []
+                    for pt in subgroup:
+                        with stats.timer("search"):
+                            found.append((pt, scan.extract(pt - begin)))
+
+                    if not scan.cut_off or end >= upper:
+                        break
+
+                    end = min(upper, 2 * end - begin)
+
+                for pt, (path, scope) in found:
+                    if not path:
+                        continue
+
+                    # the position after a path might be cut off even if the
+                    # path itself isn't
+                    info_text = text
+                    info_end = min(line.b, begin + scope[1] + context)
+                    if info_end > end:
+                        info_text = text[:scope[1]] + view.substr(
+                            sublime.Region(begin + scope[1], info_end))
+
+                    results[pt] = (path, self.get_info(
+                        info_text, scope, path, dirs, settings))
+
+        self.deadline = None
+
+        # keep the order of the points but find each path only once
         paths = []
+        found = set()
         for pt in points:
+            result = results.get(pt)
+            if result is None:
+                continue
+
+            path, info = result
+            key = (os.path.normpath(path), info.get("line"), info.get("col"))
+            if key not in found:
+                found.add(key)
+                paths.append(result)
+
+        return paths
+
+    def group_lines(self, points):
+        """Group the points by their lines.
+
+        Yields each line and the sorted points within it.
+        """
+        line = None
+        group = []
+        for pt in sorted(set(points)):
+            if group and line.contains(pt):
+                group.append(pt)
+                continue
+
+            if group:
+                yield line, group
+
+            line = self.view.line(pt)
+            group = [pt]
+
+        if group:
+            yield line, group
+
+    def group_points(self, line, points, context):
+        """Group the points of a line whose context overlaps.
+
+        Yields the beginning and end of the text around each group and the
+        points within it.
+        """
+        group = []
+        for pt in points:
+            if group and pt - group[-1] <= 2 * context:
+                group.append(pt)
+                continue
+
             # clip the text to the specified context
-            line = view.line(pt)
-            begin = max(line.a, pt - context)
-            end = min(line.b, pt + context)
+            if group:
+                yield (max(line.a, group[0] - context),
+                       min(line.b, group[-1] + context), group)
 
-            text = view.substr(sublime.Region(begin, end))
-            col = pt - begin
+            group = [pt]
 
-            # try to extract a path and match the text after for additional
-            # information
-            path, scope = self.extract_path(text, col, dirs)
-            if path:
-                info = self.match_patterns(text[scope[1]:])
-                paths.append((path, info))
+        if group:
+            yield (max(line.a, group[0] - context),
+                   min(line.b, group[-1] + context), group)
 
-        return paths
+    def grow_window(self, line, begin, points, max_context):
+        """Grow the text around some points of a long line to whole paths.
 
-    @functools.lru_cache()
-    def extract_path(self, text, cur, dirs):
-        """Extract a file path around a cursor position within a text."""
-        log.debug("Extracting from: %s^%s", text[:cur], text[cur:])
-        log.debug("Directories: %s", dirs)
-
-        # split the text into possible parts of a file path before and after
-        # the cursor position
-        before = []
-        after = []
-        for match in re.finditer(self.file_parts, text):
-            part = text[match.start():match.end()]
-            if match.start() <= cur:
-                before.append(part)
-            else:
-                after.append(part)
-
-        log.debug("Before cursor: %s", before)
-        log.debug("After cursor: %s", after)
-
-        # go through the parts before the cursor to find the ones that mark the
-        # beginning of a file path
-        path = ""
-        begin, end = 0, 0
-        for i, part in reversed(list(enumerate(before))):
-            # in case we haven't found the beginning of a path yet, it could be
-            # that there is a file consisting of multiple parts in which case
-            # we just need to blindly start testing for this possibility
-            if path == "" or self.search_path(part, dirs):
-                log.debug("Path: %s", part)
-                existing_path = part
-
-                # now find the longest path that can be constructed from all
-                # the parts after this one
-                new_path = existing_path
-                for part in chain(before[i + 1:], after):
-                    new_path += part
-                    if self.search_path(new_path, dirs):
-                        log.debug("Path: %s", new_path)
-                        existing_path = new_path
-
-                # we need to test this path again if we skipped that above
-                if path != "" or self.search_path(existing_path, dirs):
-                    log.debug("Found path: %s", existing_path)
-
-                    # check if the cursor is actually inside the found path by
-                    # summing up the elements before and within the path
-                    len_before_path = len("".join(before[:i]))
-                    len_existing_path = len(existing_path)
-                    if len_before_path + len_existing_path >= cur:
-                        # keep the longest path
-                        if len_existing_path > len(path):
-                            log.debug("Best path: %s", existing_path)
-                            path = existing_path
-                            begin = len_before_path
-                            end = begin + len_existing_path
-
-        if path:
-            # search again to return the full path for relative paths
-            return self.search_path(path, dirs), (begin, end)
-
-        return None, None
-
-    def match_patterns(self, text):
-        """Match some text for additional information about a path."""
-        log.debug("Matching patterns to: %s", text)
-
-        # find the first matching pattern and return all named groups
-        for pattern in self.get_patterns():
-            match = re.match(pattern, text)
-            if match:
-                log.debug("Found groups: %s", match.groupdict())
-                return match.groupdict()
-
-        return {}
-
-    def search_path(self, path, dirs):
-        """Search for an existing path (possibly relative to dirs)."""
-
-        # ignore special directories with no separator
-        if path in [".", ".."]:
-            return None
+        Returns the new beginning of the text and how far it may be grown to
+        the right. At most max_context characters are used on each side of the
+        points.
+        """
+        lower = max(line.a, points[0] - max_context)
+        upper = min(line.b, points[-1] + max_context)
 
-        # expand ~ to the user's home directory
-        if path.startswith("~"):
-            path = os.path.expanduser(path)
+        # a path can only be found if its beginning is part of the text, so
+        # the text starts with the words that were cut off (which are found by
+        # matching the text before it backwards)
+        if begin > lower:
+            head = self.view.substr(sublime.Region(lower, begin))
+            begin -= path_chars.match(head[::-1]).end()
 
-        # expand the environment variables
-        path = os.path.expandvars(path)
+        return begin, upper
 
-        if platform == "windows":
-            # disable UNC paths on Windows
-            if path.startswith("\\\\") or path.startswith("//"):
-                return None
+    def get_spans(self, line, settings, texts):
+        """Find the paths at all positions within a line.
 
-            # ignore spaces at the end of a path
-            if path.endswith(" "):
-                return None
+        Returns the positions (relative to the line) at which the path found
+        at a cursor changes and the path and info found from there on. Lines
+        with the same text are only searched once (see texts).
+        """
+        span_cache = get_span_cache(self.view)
+        text = self.view.substr(line)
+        key = (line.a, line.b, hash(text))
+        spans = span_cache.get(key) or texts.get(text)
+        if spans is None:
+            spans = texts[text] = self.resolve_line(text, settings)
 
-        if os.path.isabs(path):  # absolute paths
-            if os.path.exists(path):
-                return path
-        else:  # relative paths
-            for dir in dirs:
-                full_path = os.path.join(dir, path)
-                if os.path.exists(full_path):
-                    return full_path
+        span_cache.set(key, spans)
+        return spans
+
+
+class OpenAllContextPathsCommand(sublime_plugin.TextCommand):
+    """Open all file paths within a view, its selections or an output panel."""
+
+    # the number of seconds a single part of the search may take before the
+    # rest is searched later (so other plugins can use the async thread too)
+    slice_budget = 0.05
+
+    # the ids of the views that are currently being scanned
+    scanning = set()
+
+    def run(self, edit, source="view", panel="exec", show_panel=True):
+        """Run the command."""
+        view = self.get_source_view(source, panel)
+        if view is None or view.id() in self.scanning:
+            return
+
+        if source == "selection":
+            regions = [region for region in view.sel() if not region.empty()]
+        else:
+            regions = [sublime.Region(0, view.size())]
+
+        # the settings need to be loaded in the main thread and are taken from
+        # this view because panels might not know about their window
+        finder = OpenContextPathCommand(self.view)
+        settings = finder.get_settings()
+
+        self.scanning.add(view.id())
+        sublime.set_timeout_async(lambda: self.scan(
+            view, regions, finder, settings, 0, regions[0].begin(),
+            OrderedDict(), show_panel), 0)
+
+    def is_enabled(self, source="view", panel="exec", show_panel=True):
+        """Whether the command is enabled."""
+        view = self.get_source_view(source, panel)
+        if view is None:
+            return False
+
+        if source == "selection":
+            return any(not region.empty() for region in view.sel())
+
+        return True
+
+    def get_source_view(self, source, panel):
+        """Get the view to scan."""
+        if source == "panel":
+            return self.view.window().find_output_panel(panel)
+
+        return self.view
+
+    def scan(self, view, regions, finder, settings, i, point, paths,
+             show_panel):
+        """Find all paths within some regions of a view and show them.
+
+        The search is continued later from the i-th region and the point
+        whenever it took longer than the slice budget. Long lines are read
+        and searched in windows of twice max_context (see
+        core.PathFinder.scan_line) so they are never read at once.
+        """
+        try:
+            rest = self.scan_slice(view, regions, finder, settings, i, point,
+                                   paths)
+        except Exception:
+            self.scanning.discard(view.id())
+            raise
+
+        window = self.view.window()
+        if rest is not None:
+            i, point = rest
+            total = sum(region.size() for region in regions)
+            done = sum(region.size() for region in regions[:i])
+            done += point - regions[i].begin()
+            window.status_message("Scanning for paths: {}%".format(
+                100 * done // total))
+
+            sublime.set_timeout_async(lambda: self.scan(
+                view, regions, finder, settings, i, point, paths,
+                show_panel), 0)
+            return
+
+        self.scanning.discard(view.id())
+        window.status_message("Found {} path{}".format(
+            len(paths), "" if len(paths) == 1 else "s"))
+
+        paths = list(paths.items())
+        sublime.set_timeout(lambda: self.show_paths(paths, show_panel), 0)
+
+    def scan_slice(self, view, regions, finder, settings, i, point, paths):
+        """Find the paths within the regions until the slice budget is used.
+
+        Returns the region and point to continue from or None when done.
+        """
+        finder.use_settings(settings)
+        size = 2 * settings.max_context
+
+        deadline = time.perf_counter() + self.slice_budget
+        while i < len(regions):
+            region = regions[i]
+            end = min(view.line(point).end(), region.end())
+            text = view.substr(sublime.Region(point, min(end, point + size)))
+            if point + size < end:
+                text = text[:core.cut_window(text)]
+                point += len(text)
+            else:
+                # continue after the line break
+                point = end + 1
+
+            # keep only the first position of each path
+            for path, info in finder.scan_line(text, settings):
+                paths.setdefault(os.path.normpath(path), info)
+
+            if point >= region.end():
+                i += 1
+                if i == len(regions):
+                    return None
+                point = regions[i].begin()
+
+            if time.perf_counter() > deadline:
+                return i, point
 
         return None
+
+    def show_paths(self, paths, show_panel):
+        """Show the found paths in a quick panel or open all of them."""
+        if not paths:
+            return
+
+        # open the paths from this view because panels might not know about
+        # their window
+        finder = OpenContextPathCommand(self.view)
+
+        if not show_panel:
+            finder.open_paths(paths)
+            return
+
+        items = [["Open all {} paths".format(len(paths)), ""]]
+        for path, info in paths:
+            name = os.path.basename(path) or path
+            if info.get("line"):
+                name += ":{}".format(info["line"])
+            items.append([name, path])
+
+        def on_select(i):
+            if i == 0:
+                finder.open_paths(paths)
+            elif i > 0:
+                finder.open_path(*paths[i - 1])
+
+        self.view.window().show_quick_panel(items, on_select)
+
+
+class OpenContextPathMetricsCommand(sublime_plugin.ApplicationCommand):
+    """Print the timings of all phases and the cache counters."""
+
+    def run(self, reset=False):
+        """Run the command."""
+        caches = {
+            "stat": stat_cache,
+            "listing": listing_cache,
+            "search": search_cache,
+            "prefix": prefix_cache
+        }
+
+        if reset:
+            stats.reset()
+            for timed_cache in caches.values():
+                timed_cache.reset_counters()
+            return
+
+        print("OpenContextPath metrics:\n" + stats.summary(caches))
+        sublime.active_window().run_command("show_panel", {
+            "panel": "console"
+        })
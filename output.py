@@ -0,0 +1,104 @@
+"""Find the paths in output panels while text is appended to them."""
+
+import sublime
+import sublime_plugin
+
+from . import cache
+from . import open_context_path
+
+
+# the number of seconds the paths found in an output panel are remembered
+stream_ttl = 600
+
+# the position up to which each streamed output panel was searched, the last
+# line before it and the span cache holding its paths by the id of the panel
+positions = {}
+
+
+def is_output_panel(view):
+    """Whether a view is an output panel."""
+    if hasattr(view, "element"):
+        element = view.element()
+        return element is not None and element.startswith("output:")
+
+    window = view.window()
+    if window is None:
+        return False
+
+    for name in window.panels():
+        if name.startswith("output."):
+            panel = window.find_output_panel(name[len("output."):])
+            if panel is not None and panel.id() == view.id():
+                return True
+
+    return False
+
+
+def find_appended_paths(view, finder, settings):
+    """Find the paths in all complete lines that were appended to a panel.
+
+    The paths are stored in the span cache of the panel so opening them later
+    only needs to look them up.
+    """
+    size = view.size()
+    position, last_line, span_cache = positions.get(view.id(), (0, "", None))
+
+    # start over if the panel was cleared in the meantime or its paths were
+    # forgotten (or replaced by the small cache of a command)
+    span_caches = open_context_path.span_caches
+    if position > size or view.substr(sublime.Region(
+            position - len(last_line), position)) != last_line:
+        span_cache = None
+    if span_cache is None or span_caches.get(view.id()) is not span_cache:
+        position, last_line = 0, ""
+        span_cache = span_caches[view.id()] = cache.TimedCache(
+            size=open_context_path.stat_cache.size, ttl=stream_ttl)
+
+    # only search complete lines since the last one might still grow
+    end = view.substr(sublime.Region(position, size)).rfind("\n")
+    if end < 0:
+        positions[view.id()] = (position, last_line, span_cache)
+        return
+
+    end += position
+    lines = view.lines(sublime.Region(position, end))
+
+    # the paths of more lines than the cache can hold would be forgotten
+    # again anyway
+    lines = lines[-span_cache.size:] if span_cache.size > 0 else []
+
+    finder.use_settings(settings)
+    texts = {}
+    for line in lines:
+        if line.size() <= 2 * settings.context:
+            finder.get_spans(line, settings, texts)
+
+    last_line = view.substr(view.line(end)) + "\n"
+    positions[view.id()] = (end + 1, last_line, span_cache)
+
+
+class OutputPanelListener(sublime_plugin.EventListener):
+    """Find the paths in output panels while text is appended to them."""
+
+    def on_modified(self, view):
+        """Search the new lines of an output panel in the background."""
+        if view.window() is None:
+            return
+
+        if view.id() not in positions and not is_output_panel(view):
+            return
+
+        finder = open_context_path.OpenContextPathCommand(view)
+        if not finder.get_setting("resolve_output_panels", False):
+            return
+
+        # the settings need to be loaded in the main thread
+        open_context_path.streamed_views.add(view.id())
+        settings = finder.get_settings()
+
+        sublime.set_timeout_async(
+            lambda: find_appended_paths(view, finder, settings), 0)
+
+    def on_close(self, view):
+        """Forget about closed panels."""
+        positions.pop(view.id(), None)
@@ -0,0 +1,97 @@
+"""Match additional information about a path with the configured patterns."""
+
+import logging
+import re
+
+
+log = logging.getLogger("OpenContextPath")
+
+# the beginning of a named group that is not escaped
+named_group = re.compile(r"(?<!\\)\(\?P<(\w+)>")
+
+# a backreference to a named group
+named_reference = re.compile(r"(?<!\\)\(\?P=(\w+)\)")
+
+# constructs that can't be combined with other patterns (numbered references,
+# conditionals and global flags)
+unfusable = re.compile(r"\\[1-9]|\\g<|\(\?\(|^\(\?[aiLmsux]+\)")
+
+
+class PatternMatcher:
+    """Match a list of patterns at the start of a text.
+
+    All patterns are compiled once. If possible, they are combined into a
+    single regex that tries each pattern in order.
+    """
+
+    def __init__(self, patterns):
+        """Compile the patterns."""
+        self.patterns = []
+        for pattern in patterns:
+            try:
+                self.patterns.append(re.compile(pattern))
+            except (re.error, TypeError) as error:
+                log.error("Invalid pattern %r: %s", pattern, error)
+
+        self.fused = self.fuse()
+
+    def __repr__(self):
+        """Represent the matcher with its patterns."""
+        return "PatternMatcher({})".format(
+            [pattern.pattern for pattern in self.patterns])
+
+    def fuse(self):
+        """Combine all patterns into a single regex (or None if we can't)."""
+        if len(self.patterns) < 2:
+            return None
+
+        alternatives = []
+        for i, pattern in enumerate(self.patterns):
+            if unfusable.search(pattern.pattern):
+                return None
+
+            # prefix all group names with the index of the pattern to make
+            # them unique and wrap the pattern in a group to tell which one
+            # matched
+            prefix = "_{}_".format(i)
+            source = named_group.sub(
+                lambda m: "(?P<" + prefix + m.group(1) + ">", pattern.pattern)
+            source = named_reference.sub(
+                lambda m: "(?P=" + prefix + m.group(1) + ")", source)
+            alternatives.append("(?P<_{}>{})".format(i, source))
+
+        try:
+            fused = re.compile("|".join(alternatives))
+        except re.error:
+            return None
+
+        # make sure we didn't change any of the groups
+        for i, pattern in enumerate(self.patterns):
+            prefix = "_{}_".format(i)
+            names = set(name[len(prefix):] for name in fused.groupindex
+                        if name.startswith(prefix))
+            if names != set(pattern.groupindex):
+                return None
+
+        return fused
+
+    def match(self, text):
+        """Match the text and return the named groups of the first match."""
+        if self.fused:
+            match = self.fused.match(text)
+            if not match:
+                return {}
+
+            # the group of the matching pattern is the last one to be closed
+            i = int(match.lastgroup[1:])
+            names = self.patterns[i].groupindex
+            prefix = "_{}_".format(i)
+            return {name: match.group(prefix + name) for name in names}
+
+        # find the first matching pattern
+        for pattern in self.patterns:
+            match = pattern.match(text)
+            if match:
+                return match.groupdict()
+
+        return {}
@@ -0,0 +1,84 @@
+"""Read files ahead of opening them to warm the page cache of the system."""
+
+import logging
+import os
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import cache
+
+
+log = logging.getLogger("OpenContextPath")
+
+
+class Prefetcher:
+    """Read the beginning of files in a background thread."""
+
+    # the number of bytes to read at once
+    chunk_size = 1 << 20
+
+    # the number of files read at the same time (so a slow file doesn't hold
+    # up the others)
+    workers = 4
+
+    def __init__(self, ttl=60):
+        """Initialize the prefetcher.
+
+        A file is only read again after ttl seconds unless it changed.
+        """
+        self.executor = None
+
+        # the paths that are being read and the recently read files by their
+        # path, modification time and size
+        self.reading = set()
+        self.done = cache.TimedCache(size=100, ttl=ttl)
+        self.lock = threading.Lock()
+
+    def prefetch(self, path, limit):
+        """Start reading up to limit bytes of a file."""
+        with self.lock:
+            if path in self.reading:
+                return
+
+            self.reading.add(path)
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.workers)
+            executor = self.executor
+
+        executor.submit(self.read, path, limit)
+
+    def read(self, path, limit):
+        """Read up to limit bytes of a file and throw them away."""
+        try:
+            status = os.stat(path)
+
+            # reading anything else (like a FIFO) might never finish
+            if not stat.S_ISREG(status.st_mode):
+                return
+
+            key = (path, status.st_mtime, status.st_size)
+            if self.done.get(key):
+                return
+
+            log.debug("Prefetching: %s", path)
+            with open(path, "rb") as file:
+                while limit > 0:
+                    data = file.read(min(self.chunk_size, limit))
+                    if not data:
+                        break
+                    limit -= len(data)
+
+            self.done.set(key, True)
+        except OSError as error:
+            log.debug("Can't prefetch %s: %s", path, error)
+        finally:
+            with self.lock:
+                self.reading.discard(path)
+
+    def shutdown(self):
+        """Stop the thread pool without waiting for any file being read."""
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                self.executor = None
@@ -0,0 +1,140 @@
+"""Probe the file system concurrently within a time limit."""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+log = logging.getLogger("OpenContextPath")
+
+
+class Deadline:
+    """A point in time after which no more probes should be waited for."""
+
+    def __init__(self, timeout):
+        """Initialize the deadline with the timeout in seconds."""
+        self.end = time.monotonic() + timeout
+
+    def remaining(self):
+        """Return the number of seconds until the deadline."""
+        return max(self.end - time.monotonic(), 0)
+
+    def expired(self):
+        """Whether the deadline has passed."""
+        return time.monotonic() >= self.end
+
+
+class Prober:
+    """Run file system probes in a thread pool and skip slow directories."""
+
+    def __init__(self, workers=4, penalty=30):
+        """Initialize the prober.
+
+        Directories whose probes time out are skipped for the next penalty
+        seconds.
+        """
+        self.workers = workers
+        self.penalty = penalty
+        self.executor = None
+
+        # the slow directories with the time until which they are skipped and
+        # the probes that were given up on but are still running by their
+        # directories
+        self.slow = {}
+        self.abandoned = {}
+        self.lock = threading.Lock()
+
+    def is_slow(self, path):
+        """Whether a path is within a directory that is currently slow.
+
+        A directory stays slow as long as an abandoned probe within it is
+        still running (like on a mount that doesn't answer at all), so a hung
+        probe doesn't tie up more and more threads.
+        """
+        if not self.slow and not self.abandoned:
+            return False
+
+        now = time.monotonic()
+        with self.lock:
+            while True:
+                if path in self.abandoned:
+                    return True
+
+                until = self.slow.get(path)
+                if until is not None:
+                    if now < until:
+                        return True
+
+                    del self.slow[path]
+
+                parent = os.path.dirname(path)
+                if parent == path or not parent:
+                    return False
+
+                path = parent
+
+    def mark_slow(self, dir):
+        """Skip a directory for a while."""
+        log.info("Skipping slow directory for %ss: %s", self.penalty, dir)
+        with self.lock:
+            self.slow[dir] = time.monotonic() + self.penalty
+
+    def submit(self, dir, func, *args):
+        """Start a probe within a directory (or return None if it is slow)."""
+        if self.is_slow(dir):
+            return None
+
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.workers)
+
+        return self.executor.submit(func, *args)
+
+    def wait(self, future, dir, deadline):
+        """Wait for the result of a probe until the deadline.
+
+        Returns None if the probe didn't finish in time.
+        """
+        if future is None:
+            return None
+
+        remaining = deadline.remaining()
+        try:
+            return future.result(timeout=remaining)
+        except TimeoutError:
+            # only blame the directory if it actually had some time
+            if remaining > 0:
+                self.mark_slow(dir)
+
+            self.abandon(future, dir)
+            return None
+
+    def abandon(self, future, dir):
+        """Skip a directory until a probe nobody waits for anymore is done."""
+        with self.lock:
+            self.abandoned.setdefault(dir, set()).add(future)
+
+        def release(future):
+            with self.lock:
+                futures = self.abandoned.get(dir, set())
+                futures.discard(future)
+                if not futures:
+                    self.abandoned.pop(dir, None)
+
+        future.add_done_callback(release)
+
+    def run(self, dir, deadline, func, *args):
+        """Run a single probe within a directory until the deadline."""
+        if deadline.expired():
+            return None
+
+        return self.wait(self.submit(dir, func, *args), dir, deadline)
+
+    def shutdown(self):
+        """Stop the thread pool without waiting for any stuck probes."""
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                self.executor = None
@@ -0,0 +1,452 @@
+"""Benchmark path detection on a large virtual file system.
+
+Run this script with any Python 3 interpreter (Sublime Text is not needed):
+
+    python tests/benchmark.py --output results.json
+    python tests/benchmark.py --latency 0.1 --compare results.json
+
+The results are written as JSON and can be compared with the results of a
+previous run to find regressions.
+"""
+
+import argparse
+import errno
+import importlib
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+import types
+
+from unittest import mock
+
+
+# the directory of the package
+package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def install_sublime():
+    """Provide the parts of the Sublime Text API the package needs.
+
+    Nothing is replaced when the script runs within Sublime Text.
+    """
+    try:
+        import sublime  # noqa: F401
+        import sublime_plugin  # noqa: F401
+        return
+    except ImportError:
+        pass
+
+    class Settings(dict):
+        """Settings that never change."""
+
+        def add_on_change(self, key, callback):
+            """Ignore the callback."""
+
+        def clear_on_change(self, key):
+            """Ignore the callback."""
+
+    settings = {}
+
+    def load_settings(name):
+        """Load the default settings of the package (without comments)."""
+        if name not in settings:
+            settings[name] = Settings()
+
+            path = os.path.join(package_dir, name)
+            if os.path.exists(path):
+                with open(path) as file:
+                    text = re.sub(r"^\s*//.*$", "", file.read(),
+                                  flags=re.MULTILINE)
+                settings[name].update(json.loads(text))
+
+        return settings[name]
+
+    class Region:
+        """A region of text."""
+
+        def __init__(self, a, b=None):
+            """Initialize the region."""
+            self.a = a
+            self.b = a if b is None else b
+
+        def begin(self):
+            """Return the first point of the region."""
+            return min(self.a, self.b)
+
+        def end(self):
+            """Return the point after the region."""
+            return max(self.a, self.b)
+
+        def size(self):
+            """Return the length of the region."""
+            return self.end() - self.begin()
+
+        def empty(self):
+            """Whether the region is empty."""
+            return self.a == self.b
+
+        def contains(self, point):
+            """Whether a point is within the region."""
+            return self.begin() <= point <= self.end()
+
+    api = types.ModuleType("sublime")
+    api.ENCODED_POSITION = 1
+    api.Region = Region
+    api.load_settings = load_settings
+    api.platform = lambda: "linux"
+    api.expand_variables = lambda value, variables: value
+    api.cache_path = lambda: os.path.join(package_dir, ".cache")
+    api.windows = lambda: []
+
+    plugin_api = types.ModuleType("sublime_plugin")
+    plugin_api.EventListener = object
+    plugin_api.ApplicationCommand = object
+    plugin_api.TextCommand = type("TextCommand", (), {
+        "__init__": lambda self, view: setattr(self, "view", view)
+    })
+
+    sys.modules["sublime"] = api
+    sys.modules["sublime_plugin"] = plugin_api
+
+
+def import_package():
+    """Import the package as OpenContextPath from wherever it is."""
+    package = types.ModuleType("OpenContextPath")
+    package.__path__ = [package_dir]
+    sys.modules.setdefault("OpenContextPath", package)
+
+    return importlib.import_module("OpenContextPath.open_context_path")
+
+
+class VirtualFileSystem:
+    """A file system in memory that counts (and slows down) all lookups."""
+
+    def __init__(self, files, latency=0):
+        """Create the file system from a list of files.
+
+        Every lookup takes at least latency seconds.
+        """
+        self.latency = latency
+        self.stats = 0
+        self.listings = 0
+
+        # the entries of all directories by their path
+        self.dirs = {}
+        self.files = set()
+        for file in files:
+            self.files.add(file)
+            head, name = os.path.split(file)
+            while name:
+                self.dirs.setdefault(head, set()).add(name)
+                head, name = os.path.split(head)
+
+    def exists(self, path):
+        """Check whether a path exists."""
+        self.stats += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        path = os.path.normpath(path)
+        if path.startswith("//"):
+            path = path[1:]
+
+        return path in self.files or path in self.dirs
+
+    def listdir(self, path):
+        """List the entries of a directory."""
+        self.listings += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        path = os.path.normpath(path)
+        if path in self.dirs:
+            return list(self.dirs[path])
+
+        error = errno.ENOTDIR if path in self.files else errno.ENOENT
+        raise OSError(error, os.strerror(error), path)
+
+    def reset(self):
+        """Reset the counters."""
+        self.stats = 0
+        self.listings = 0
+
+
+class View:
+    """A view showing some text for find_paths_at."""
+
+    def __init__(self, text, folders):
+        """Initialize the view."""
+        self.text = text
+        self.window_ = Window(self, folders)
+
+    def id(self):
+        """Return the id of the view."""
+        return 1
+
+    def settings(self):
+        """Return the settings of the view."""
+        return sys.modules["sublime"].load_settings("View")
+
+    def window(self):
+        """Return the window of the view."""
+        return self.window_
+
+    def substr(self, region):
+        """Return the text within a region."""
+        return self.text[region.begin():region.end()]
+
+    def line(self, point):
+        """Return the line containing a point."""
+        begin = self.text.rfind("\n", 0, point) + 1
+        end = self.text.find("\n", point)
+        return sys.modules["sublime"].Region(
+            begin, len(self.text) if end < 0 else end)
+
+
+class Window:
+    """The window of a view."""
+
+    def __init__(self, view, folders):
+        """Initialize the window."""
+        self.view = view
+        self.folders_ = folders
+
+    def active_view(self):
+        """Return the active view of the window."""
+        return self.view
+
+    def extract_variables(self):
+        """Return the variables of the window."""
+        return {}
+
+    def project_file_name(self):
+        """Return the project file of the window."""
+        return None
+
+    def folders(self):
+        """Return the folders of the window."""
+        return list(self.folders_)
+
+
+def create_files(rng, root, count):
+    """Create the paths of a synthetic source tree."""
+    extensions = [".cpp", ".h", ".py", ".js", ".txt"]
+    files = []
+    dirs = [root]
+    while len(files) < count:
+        parent = rng.choice(dirs)
+        if rng.random() < 0.15 and parent.count("/") < 12:
+            dirs.append(parent + "/{}{}".format(
+                rng.choice(["src", "lib", "module", "test", "util"]),
+                len(dirs)))
+        else:
+            files.append(parent + "/file{}{}".format(
+                len(files), rng.choice(extensions)))
+
+    return files
+
+
+def create_inputs(rng, root, files):
+    """Create lines of typical output with the cursor within a path."""
+
+    def relative(file):
+        return os.path.relpath(file, root)
+
+    templates = {
+        "gcc": lambda file: (
+            "{}:{}:{}: error: 'widget' was not declared in this scope".format(
+                relative(file), rng.randint(1, 999), rng.randint(1, 80)),
+            0),
+        "pytest": lambda file: (
+            "{}:{}: AssertionError: assert 42 == 43".format(
+                relative(file), rng.randint(1, 999)),
+            0),
+        "traceback": lambda file: (
+            "  File \"{}\", line {}, in run".format(
+                file, rng.randint(1, 999)),
+            9),
+        "deep_relative": lambda file: (
+            "see ../../{}/{} for details".format(
+                os.path.basename(root), relative(file)),
+            4),
+        "minified": lambda file: (
+            "".join("var a{0}=b{0}.c(d,e/f);".format(i)
+                    for i in range(400)) + file,
+            None)
+    }
+
+    inputs = {}
+    for name, template in templates.items():
+        lines = []
+        for i in range(50):
+            text, begin = template(rng.choice(files))
+            if begin is None:
+                begin = len(text) - 10
+
+            lines.append((text, begin + 5))
+
+        inputs[name] = lines
+
+    return inputs
+
+
+def measure(func, fs, repeat):
+    """Measure the time, lookups and allocations of a function.
+
+    All caches are cleared before each cold run, the warm run reuses the
+    caches of the last one.
+    """
+    module = sys.modules["OpenContextPath.open_context_path"]
+
+    times = []
+    for i in range(repeat):
+        module.clear_caches()
+        fs.reset()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    stats, listings = fs.stats, fs.listings
+
+    start = time.perf_counter()
+    func()
+    warm = time.perf_counter() - start
+
+    module.clear_caches()
+    tracemalloc.start()
+    func()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "time": min(times),
+        "median_time": statistics.median(times),
+        "warm_time": warm,
+        "stats": stats,
+        "listings": listings,
+        "peak_memory": peak
+    }
+
+
+def run_benchmarks(args):
+    """Run all benchmarks and return their results."""
+    module = import_package()
+    rng = random.Random(args.seed)
+
+    root = "/bench/project"
+    files = create_files(rng, root, args.files)
+    inputs = create_inputs(rng, root, files)
+    fs = VirtualFileSystem(files, args.latency / 1000)
+
+    dirs = (root, root + "/src1")
+    command = module.OpenContextPathCommand(View("", [root]))
+    command.get_view_settings = lambda: {}
+    matcher = module.PatternMatcher(command.get_patterns())
+    context = command.get_context()
+
+    results = {}
+    with mock.patch("os.path.exists", fs.exists), \
+            mock.patch("os.listdir", fs.listdir):
+        for name, lines in sorted(inputs.items()):
+            # clip the lines to the context around the cursor like the command
+            texts = []
+            for text, cur in lines:
+                begin = max(cur - context, 0)
+                texts.append((text[begin:cur + context], cur - begin))
+
+            def extract():
+                for text, cur in texts:
+                    command.extract_path(text, cur, dirs)
+
+            results["extract_path/" + name] = measure(extract, fs, args.repeat)
+
+            # the text after each path to match the patterns against
+            rests = []
+            for text, cur in texts:
+                path, scope = command.extract_path(text, cur, dirs)
+                rests.append(text[scope[1]:] if scope else text)
+
+            def match():
+                for rest in rests:
+                    matcher.match(rest)
+
+            results["match_patterns/" + name] = measure(
+                match, fs, args.repeat)
+
+            # search all lines of the input at once like in a view
+            view = View("\n".join(text for text, cur in lines), [root])
+            finder = module.OpenContextPathCommand(view)
+            finder.get_view_settings = lambda: {"directories": list(dirs)}
+            points = []
+            offset = 0
+            for text, cur in lines:
+                points.append(offset + cur)
+                offset += len(text) + 1
+
+            def find():
+                finder.find_paths_at(points)
+
+            results["find_paths_at/" + name] = measure(
+                find, fs, args.repeat)
+
+    return {
+        "python": platform.python_version(),
+        "files": args.files,
+        "latency": args.latency,
+        "seed": args.seed,
+        "results": results
+    }
+
+
+def compare(results, previous):
+    """Print the relative change of all times compared to previous results."""
+    for name, result in sorted(results["results"].items()):
+        old = previous["results"].get(name)
+        if old is None:
+            continue
+
+        change = (result["time"] - old["time"]) / old["time"] \
+            if old["time"] else 0
+        print("{:40} {:10.3f}ms {:+7.1%}  stats {} -> {}".format(
+            name, result["time"] * 1000, change, old["stats"],
+            result["stats"]))
+
+
+def main():
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--files", type=int, default=20000,
+                        help="the number of files in the virtual tree")
+    parser.add_argument("--latency", type=float, default=0,
+                        help="the milliseconds each lookup takes")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="the number of cold runs of each benchmark")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="the seed of the synthetic inputs")
+    parser.add_argument("--output", help="the file to write the results to")
+    parser.add_argument("--compare", help="the results of a previous run")
+    args = parser.parse_args()
+
+    install_sublime()
+    results = run_benchmarks(args)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
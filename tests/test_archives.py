@@ -0,0 +1,133 @@
+"""Test finding paths within zip archives."""
+
+import os
+import tempfile
+import zipfile
+
+from unittest import mock, TestCase
+
+import sublime
+
+from OpenContextPath import archives
+from OpenContextPath.core import PathFinder, clear_caches
+from OpenContextPath.open_context_path import OpenContextPathCommand
+
+
+class TestArchives(TestCase):
+    """Test looking up and extracting the members of archives."""
+
+    def setUp(self):
+        """Create a directory with an archive."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = temp_dir.name
+
+        os.mkdir(os.path.join(self.dir, "lib"))
+        self.jar = os.path.join(self.dir, "lib", "foo.jar")
+        with zipfile.ZipFile(self.jar, "w") as zip_file:
+            zip_file.writestr("com/x/Y.java", "class Y {}\n")
+            zip_file.writestr("META-INF/MANIFEST.MF", "")
+
+        # a directory named like an archive containing an archive
+        os.makedirs(os.path.join(self.dir, "proj.zip", "lib"))
+        self.nested = os.path.join(self.dir, "proj.zip", "lib", "bar.jar")
+        with zipfile.ZipFile(self.nested, "w") as zip_file:
+            zip_file.writestr("a.txt", "")
+
+        # an unpacked egg is no archive
+        os.makedirs(os.path.join(self.dir, "pkg.egg", "pkg"))
+        with open(os.path.join(self.dir, "pkg.egg", "pkg", "mod.py"), "w"):
+            pass
+
+        extract_dir = os.path.join(self.dir, "extracted")
+        patcher = mock.patch.object(archives, "extract_dir", extract_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        archives.archives.clear()
+        clear_caches()
+
+    def test_members(self):
+        """Testing the lookup of members."""
+        jar = self.jar
+        self.assertTrue(archives.exists(jar + "!/com/x/Y.java"))
+        self.assertTrue(archives.exists(jar + "/com/x/Y.java"))
+        self.assertTrue(archives.exists(jar + "!/com/x"))
+        self.assertTrue(archives.exists(jar + "!/"))
+        self.assertFalse(archives.exists(jar + "!"))
+        self.assertFalse(archives.exists(jar + "!/com/x/Z.java"))
+        self.assertIsNone(archives.exists(jar))
+        self.assertIsNone(archives.exists(
+            os.path.join(self.dir, "pkg.egg", "pkg", "mod.py")))
+        self.assertTrue(archives.exists(self.nested + "!/a.txt"))
+        self.assertFalse(archives.exists(self.nested + "!/b.txt"))
+
+        self.assertTrue(archives.has_prefix(jar + "!"))
+        self.assertTrue(archives.has_prefix(jar + "!/com/x/Y"))
+        self.assertFalse(archives.has_prefix(jar + "!/org"))
+
+        self.assertTrue(archives.is_dir(jar + "!/com/x"))
+        self.assertFalse(archives.is_dir(jar + "!/com/x/Y.java"))
+
+    def test_cached_members(self):
+        """Testing that archives are only read again when they change."""
+        with mock.patch.object(archives, "read_members",
+                               wraps=archives.read_members) as read_members, \
+                mock.patch.object(archives, "check_interval", 0):
+            for i in range(3):
+                self.assertTrue(archives.exists(self.jar + "!/com/x/Y.java"))
+            self.assertEqual(read_members.call_count, 1)
+
+            with zipfile.ZipFile(self.jar, "a") as zip_file:
+                zip_file.writestr("com/x/Z.java", "class Z {}\n")
+            self.assertTrue(archives.exists(self.jar + "!/com/x/Z.java"))
+            self.assertEqual(read_members.call_count, 2)
+
+    def test_extract(self):
+        """Testing the extraction of members."""
+        path = archives.extract(self.jar + "!/com/x/Y.java")
+        with open(path) as file:
+            self.assertEqual(file.read(), "class Y {}\n")
+
+        self.assertEqual(archives.extract(self.jar + "!/com/x/Y.java"), path)
+        self.assertIsNone(archives.extract(self.jar + "!/com/x"))
+        self.assertIsNone(archives.extract(self.jar + "!/com/x/Z.java"))
+
+    def test_open(self):
+        """Testing that members are extracted in the background."""
+        view = mock.Mock()
+        command = OpenContextPathCommand(view)
+        command.get_setting = lambda name, default: \
+            True if name == "search_archives" else default
+
+        with mock.patch.object(sublime, "set_timeout_async") as run_async, \
+                mock.patch.object(sublime, "set_timeout",
+                                  lambda function, delay: function()):
+            command.open_path(self.jar + "!/com/x/Y.java", {"line": "3"})
+            view.window().open_file.assert_not_called()
+
+            (extract, delay), kwargs = run_async.call_args
+            extract()
+
+        path = archives.extract(self.jar + "!/com/x/Y.java")
+        view.window().open_file.assert_called_once_with(
+            path + ":3", sublime.ENCODED_POSITION)
+
+    def test_paths(self):
+        """Testing paths leading into archives within texts."""
+        finder = PathFinder()
+        finder.search_archives = True
+        dirs = (self.dir,)
+
+        for text, path in [
+                ("at lib/foo.jar!/com/x/^Y.java:12",
+                 "lib/foo.jar!/com/x/Y.java"),
+                ("at lib/^foo.jar/com/x/Y.java:12",
+                 "lib/foo.jar/com/x/Y.java"),
+                ("see lib/foo.^jar!/com/x/Z.java", "lib/foo.jar!/com/x/"),
+                ("see lib/^foo.jar for details", "lib/foo.jar"),
+                ("pkg.egg/pkg/^mod.py", "pkg.egg/pkg/mod.py")]:
+            cur = text.index("^")
+            text = text.replace("^", "")
+            found, scope = finder.extract_path(text, cur, dirs)
+            self.assertEqual(found, os.path.join(self.dir, path), text)
@@ -0,0 +1,87 @@
+"""Test finding paths from the command line."""
+
+import io
+import os
+import sys
+import tempfile
+
+from unittest import mock, TestCase
+
+from OpenContextPath import cli
+from OpenContextPath.core import PathFinder, clear_caches
+
+
+class TestCli(TestCase):
+    """Test finding the paths in a log."""
+
+    # the default patterns
+    patterns = [
+        ":(?P<line>\\d+)(?::(?P<col>\\d+))?",
+        "[\"'], line (?P<line>\\d+)"
+    ]
+
+    def setUp(self):
+        """Create a directory with some files."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = temp_dir.name
+
+        os.mkdir(os.path.join(self.dir, "src"))
+        for name in ["main.c", "util.c"]:
+            with open(os.path.join(self.dir, "src", name), "w"):
+                pass
+
+        clear_caches()
+
+    def find_paths(self, text):
+        """Find the formatted paths within a text."""
+        initargs = ([self.dir], self.patterns, 100, 0, 1000, 10, False)
+        return [cli.format_path(path, info) for path, info in
+                cli.find_paths(io.StringIO(text), 1, initargs)]
+
+    def test_log(self):
+        """Testing the paths within the lines of a log."""
+        main = os.path.join(self.dir, "src", "main.c")
+        util = os.path.join(self.dir, "src", "util.c")
+
+        # the lines are read in multiple chunks
+        with mock.patch.object(cli, "chunk_size", 2):
+            paths = self.find_paths(
+                "src/main.c:42:10: error: 'x' undeclared\n"
+                "In file included from src/util.c:3,\n"
+                "no paths in here\n"
+                "  File \"" + main + "\", line 7, in run\r\n"
+                "missing.c:1: error")
+
+        self.assertEqual(paths, [main + ":42:10", util + ":3", main + ":7"])
+
+    def test_context(self):
+        """Testing that long lines are searched in windows of the context."""
+        main = os.path.join(self.dir, "src", "main.c")
+        with mock.patch.object(PathFinder, "extract_paths", autospec=True,
+                               side_effect=PathFinder.extract_paths) as \
+                extract_paths:
+            paths = self.find_paths("{0} src/main.c:1 {0}".format("x" * 500))
+
+        self.assertEqual(paths, [main + ":1"])
+        self.assertEqual(max(len(args[1]) for args, kwargs in
+                             extract_paths.call_args_list), 200)
+
+    def test_broken_pipe(self):
+        """Testing that the output stops quietly once its reader is gone."""
+        log = os.path.join(self.dir, "build.log")
+        with open(log, "w") as file:
+            file.write("src/main.c:1\nsrc/util.c:2\n")
+
+        stdout = mock.Mock()
+        stdout.fileno.return_value = 1
+        stdout.write.side_effect = BrokenPipeError
+        with mock.patch.object(sys, "stdout", stdout), \
+                mock.patch("os.open", return_value=10), \
+                mock.patch("os.dup2") as dup2, \
+                self.assertRaises(SystemExit) as context:
+            cli.main(["-d", self.dir, "-j", "1", log])
+
+        self.assertEqual(context.exception.code, 1)
+        dup2.assert_called_once_with(10, 1)
+        self.assertEqual(stdout.write.call_count, 1)
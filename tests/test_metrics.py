@@ -0,0 +1,73 @@
+"""Test collecting the timings of the path detection."""
+
+import threading
+
+from unittest import TestCase
+
+from OpenContextPath.cache import TimedCache
+from OpenContextPath.metrics import Metrics
+
+
+class TestMetrics(TestCase):
+    """Test the timings of all phases and of the last invocation."""
+
+    def setUp(self):
+        """Create the metrics."""
+        self.metrics = Metrics()
+
+    def test_timings(self):
+        """Testing the totals and the last invocation."""
+        metrics = self.metrics
+        metrics.begin()
+        with metrics.timer("stat"):
+            pass
+        metrics.add("stat", 0.5)
+        metrics.add("match", 0.25)
+
+        calls, total, maximum = metrics.total["stat"]
+        self.assertEqual(calls, 2)
+        self.assertGreaterEqual(total, 0.5)
+        self.assertEqual(maximum, 0.5)
+        self.assertEqual(metrics.last["match"], [1, 0.25])
+
+        # a new invocation only forgets the last timings
+        metrics.begin()
+        metrics.add("stat", 0.125)
+        self.assertEqual(metrics.total["stat"][0], 3)
+        self.assertEqual(metrics.last, {"stat": [1, 0.125]})
+
+        metrics.reset()
+        self.assertEqual(metrics.total, {})
+        self.assertEqual(metrics.last, {})
+
+    def test_background_threads(self):
+        """Testing that other threads don't count for the last invocation."""
+        metrics = self.metrics
+        metrics.begin()
+        metrics.add("search", 0.5)
+
+        thread = threading.Thread(target=metrics.add, args=("search", 2.0))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(metrics.total["search"], [2, 2.5, 2.0])
+        self.assertEqual(metrics.last, {"search": [1, 0.5]})
+
+    def test_summary(self):
+        """Testing the summary of the timings and caches."""
+        metrics = self.metrics
+        metrics.begin()
+        metrics.add("stat", 0.002)
+
+        cache = TimedCache(size=10, ttl=60)
+        cache.set("key", True)
+        cache.get("key")
+        cache.get("other")
+
+        lines = metrics.summary({"stat": cache}).splitlines()
+        self.assertEqual(lines[0].split(), [
+            "Phase", "Calls", "Total", "ms", "Mean", "ms", "Max", "ms", "Last",
+            "ms"])
+        self.assertIn("stat 1 2.00 2.000 2.000 2.000",
+                      [" ".join(line.split()) for line in lines])
+        self.assertEqual(lines[-1].split(), ["stat", "1", "1", "50.0%", "1"])
@@ -0,0 +1,113 @@
+"""Test finding the paths in output panels while text is appended."""
+
+import os
+import tempfile
+
+from unittest import mock, TestCase
+
+import sublime
+
+from OpenContextPath import output
+from OpenContextPath.open_context_path import (
+    OpenContextPathCommand, clear_caches, get_span_cache, span_caches,
+    stat_cache, update_settings)
+
+
+class TestOutput(TestCase):
+    """Test searching the lines appended to an output panel."""
+
+    def setUp(self):
+        """Create a directory with some files and an output panel."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = temp_dir.name
+
+        os.mkdir(os.path.join(self.dir, "src"))
+        for name in ["f1.txt", "f2.txt", "f3.txt"]:
+            with open(os.path.join(self.dir, "src", name), "w"):
+                pass
+
+        patcher = mock.patch.dict(output.positions, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        clear_caches()
+        self.panel = self.create_panel()
+        self.finder = OpenContextPathCommand(self.panel)
+
+    def create_panel(self):
+        """Create an output panel whose text can be appended to."""
+        panel = mock.Mock()
+        panel.text = ""
+        panel.id.return_value = 3000
+        panel.size.side_effect = lambda: len(panel.text)
+        panel.substr.side_effect = \
+            lambda region: panel.text[region.begin():region.end()]
+
+        def line(point):
+            begin = panel.text.rfind("\n", 0, point) + 1
+            end = panel.text.find("\n", point)
+            return sublime.Region(begin, len(panel.text) if end < 0 else end)
+
+        def lines(region):
+            begin = region.begin()
+            while begin <= region.end():
+                found = line(begin)
+                yield found
+                begin = found.end() + 1
+
+        panel.line.side_effect = line
+        panel.lines.side_effect = lambda region: list(lines(region))
+        panel.settings.return_value.get.side_effect = {"open_context_path": {
+            "directories": [self.dir]
+        }}.get
+
+        window = panel.window.return_value
+        window.active_view.return_value = panel
+        window.folders.return_value = []
+        window.extract_variables.return_value = {}
+        window.project_file_name.return_value = None
+
+        # forget about the snapshots of other tests
+        update_settings()
+        return panel
+
+    def append(self, text):
+        """Append some text to the panel and search it."""
+        self.panel.text += text
+        with mock.patch.object(self.finder, "resolve_line",
+                               wraps=self.finder.resolve_line) as \
+                resolve_line:
+            output.find_appended_paths(
+                self.panel, self.finder, self.finder.get_settings())
+
+        return [args[0] for args, kwargs in resolve_line.call_args_list]
+
+    def test_appended_lines(self):
+        """Testing that only new complete lines are searched."""
+        self.assertEqual(self.append("see src/f1.txt\nand src/"),
+                         ["see src/f1.txt"])
+        self.assertEqual(self.append("f2.txt\n"), ["and src/f2.txt"])
+        self.assertEqual(self.append("more"), [])
+
+        # the panel was cleared and written again
+        self.panel.text = ""
+        self.assertEqual(self.append("at src/f3.txt\n"), ["at src/f3.txt"])
+
+    def test_own_cache(self):
+        """Testing that the panel doesn't use the cache of a command."""
+        command_cache = get_span_cache(self.panel)
+        self.append("see src/f1.txt\n")
+
+        span_cache = span_caches[self.panel.id()]
+        self.assertIsNot(span_cache, command_cache)
+        self.assertEqual(span_cache.size, stat_cache.size)
+        self.assertEqual(span_cache.ttl, output.stream_ttl)
+
+    def test_cleared_cache(self):
+        """Testing that all lines are searched again after clearing caches."""
+        self.append("see src/f1.txt\n")
+        clear_caches()
+        self.assertEqual(self.append("and src/f2.txt\n"),
+                         ["see src/f1.txt", "and src/f2.txt"])
+        self.assertEqual(self.append("at src/f3.txt\n"), ["at src/f3.txt"])
@@ -1,19 +1,63 @@
 """Test path detection."""
 
+import errno
+import itertools
 import ntpath
 import os
 import posixpath
 import re
+import tempfile
+import time
 
+from collections import OrderedDict
+from contextlib import contextmanager
 from itertools import accumulate
 from unittest import mock, TestCase
 
-from OpenContextPath.open_context_path import OpenContextPathCommand
+import sublime
+
+from OpenContextPath import index
+from OpenContextPath.core import Settings
+from OpenContextPath.index import (
+    DirectoryGlob, DirectoryIndex, GitIndex, GitRepository, NameIndex)
+from OpenContextPath.open_context_path import (
+    OpenAllContextPathsCommand, OpenContextPathCommand,
+    OpenContextPathListener, clear_caches, prober, update_settings)
+from OpenContextPath.patterns import PatternMatcher
+
+
+class ViewSettings(dict):
+    """The settings of a view that report their changes."""
+
+    def __init__(self, *args):
+        """Initialize the settings."""
+        super().__init__(*args)
+        self.callbacks = []
+
+    def set(self, key, value):
+        """Change a setting."""
+        self[key] = value
+        for callback in self.callbacks:
+            callback()
+
+    def add_on_change(self, key, callback):
+        """Call a function whenever a setting changes."""
+        self.callbacks.append(callback)
+
+    def clear_on_change(self, key):
+        """Forget about all functions to call."""
+        self.callbacks = []
 
 
 class BaseTestCase(TestCase):
     """Base test case for path detection."""
 
+    # the ids of all views created by the tests
+    view_ids = itertools.count(1000)
+
+    # the modification times of virtual directories
+    mtimes = {}
+
     def setUp(self):
         """Set up the test environment."""
         self.command = OpenContextPathCommand(None)
@@ -21,13 +65,17 @@ class BaseTestCase(TestCase):
         # make the command use only the global settings
         self.command.get_view_settings = lambda: {}
 
+        # forget about the files of other tests
+        clear_caches()
+
     def extract_paths(self, tests):
         """Run the command's extract_path on multiples texts."""
 
         # replace the whole os.path module
         with mock.patch.object(os, 'path', self.path_module):
-            # test the paths with our own os.path.exists
-            with mock.patch("os.path.exists", self.path_exists):
+            # test the paths with our own os.path.exists and os.listdir
+            with mock.patch("os.path.exists", self.path_exists), \
+                    mock.patch("os.listdir", self.list_directory):
                 for text, path, *tail in tests:
                     info = tail[0] if tail else {}
 
@@ -47,16 +95,152 @@ class BaseTestCase(TestCase):
                         self.assertEqual(matched_info, info,
                                          "text={}".format(text[scope[1]:]))
 
+    @contextmanager
+    def virtual_file_system(self):
+        """Use the virtual files instead of the file system."""
+        with mock.patch.object(os, 'path', self.path_module), \
+                mock.patch("os.path.exists", self.path_exists), \
+                mock.patch("os.listdir", self.list_directory):
+            yield
+
+    def create_view(self, text):
+        """Create a view showing a text with the cursors at every ^."""
+        points = []
+        for part in text.split("^")[:-1]:
+            points.append((points[-1] if points else 0) + len(part))
+        text = text.replace("^", "")
+
+        def line(point):
+            begin = text.rfind("\n", 0, point) + 1
+            end = text.find("\n", point)
+            return sublime.Region(begin, len(text) if end < 0 else end)
+
+        view = mock.Mock()
+        view.id.return_value = next(self.view_ids)
+        view.change_count.return_value = 0
+        view.size.return_value = len(text)
+        view.substr.side_effect = \
+            lambda region: text[region.begin():region.end()]
+        view.line.side_effect = line
+        view.sel.return_value = [sublime.Region(point) for point in points]
+        view.settings.return_value = ViewSettings({"open_context_path": {
+            "directories": list(self.directories)
+        }})
+
+        window = view.window.return_value
+        window.active_view.return_value = view
+        window.folders.return_value = []
+        window.extract_variables.return_value = {}
+        window.project_file_name.return_value = None
+
+        # forget about the snapshots of other tests
+        update_settings()
+        return view
+
+    def create_command(self, view):
+        """Create the command for a view."""
+        command = OpenContextPathCommand(view)
+        command.file_parts = self.command.file_parts
+        return command
+
+    def get_settings(self):
+        """Create a settings snapshot for the virtual directories."""
+        return Settings(
+            context=100,
+            max_context=4096,
+            directories=self.directories,
+            patterns=PatternMatcher(self.command.get_patterns()),
+            indexes=self.command.indexes,
+            names=self.command.names,
+            timeout=0,
+            archives=False)
+
+    def extract_all_cursors(self, text):
+        """Extract the path and info at every cursor position of a text."""
+        results = []
+        for cur in range(len(text) + 1):
+            path, scope = self.command.extract_path(
+                text, cur, self.directories)
+            results.append((path, self.command.match_patterns(
+                text[scope[1]:]) if scope else None))
+
+        return results
+
     def path_exists(self, path):
         """Check whether some virtual path exist."""
         return os.path.normpath(path) in self.paths
 
+    def list_directory(self, path):
+        """List the entries of some virtual directory."""
+        path = os.path.normpath(path)
+        names = set()
+        for file in self.virtual_files:
+            head, name = os.path.split(file)
+            while name:
+                if os.path.normpath(head) == path:
+                    names.add(name)
+                head, name = os.path.split(head)
+
+        if not names:
+            error = errno.ENOTDIR if path in self.paths else errno.ENOENT
+            raise OSError(error, os.strerror(error), path)
+
+        return list(names)
+
+    def index_directories(self):
+        """Create indexes of the virtual files for all directories."""
+        indexes = {}
+        for dir in self.directories:
+            root = os.path.join(dir, "")
+            tree = {}
+            for file in self.virtual_files:
+                if file.startswith(root):
+                    node = tree
+                    *dirs, name = file[len(root):].split(self.separator)
+                    for part in dirs:
+                        node = node.setdefault(part, {})
+                    node[name] = None
+
+            dir_index = DirectoryIndex(dir, ttl=60, limit=1000)
+            dir_index.tree = tree
+            dir_index.time = time.monotonic()
+            indexes[dir] = dir_index
+
+        self.command.indexes = indexes
+
+    def list_entries(self, path):
+        """List the subdirectories and files of some virtual directory."""
+        names = sorted(self.list_directory(path))
+        self.listed.append(path)
+
+        dirnames = [name for name in names if any(
+            file.startswith(os.path.join(path, name, ""))
+            for file in self.virtual_files)]
+        filenames = [name for name in names if name not in dirnames]
+        return dirnames, filenames
+
+    def index_names(self, roots, cache_dir=None):
+        """Create an index of the names of all virtual files."""
+        names = NameIndex(roots, ttl=60, limit=1000, excludes=[],
+                          cache_dir=cache_dir)
+
+        self.listed = []
+        with mock.patch.object(os, 'path', self.path_module), \
+                mock.patch("OpenContextPath.index.list_directory",
+                           self.list_entries), \
+                mock.patch("OpenContextPath.index.get_mtime",
+                           lambda path: self.mtimes.get(path, 0)):
+            names.build()
+
+        self.command.names = names
+
 
 class TestPathsUnix(BaseTestCase):
     """Test path detection on Unix."""
 
     # the path module we need for these tests
     path_module = posixpath
+    separator = "/"
 
     # a list of files for which we pretend that they exist
     virtual_files = [
@@ -122,6 +306,680 @@ class TestPathsUnix(BaseTestCase):
             ("\\root\\dir1\\file1.^txt", None)
         ])
 
+    def test_long_texts(self):
+        """Testing paths within long texts."""
+        filler = "some text without any paths, " * 200
+        self.extract_paths([
+            (filler + "/root/dir1/file^1.txt:42 " + filler,
+             "/root/dir1/file1.txt", {"line": "42", "col": None}),
+            (filler + "dir2/sub/^file2.txt " + filler,
+             "/root/dir2/sub/file2.txt"),
+            (filler + "^" + filler, None)
+        ])
+
+    def test_resolved_spans(self):
+        """Testing the paths of a line resolved at once."""
+        text = ("see /root/dir1/file1.txt:42:7 and dir2/sub/file2.txt, "
+                "not dir3/file3.txt or /root/dir1/")
+        settings = self.get_settings()
+
+        with self.virtual_file_system():
+            spans = self.command.resolve_line(text, settings)
+            expected = self.extract_all_cursors(text)
+
+        for cur, (path, info) in enumerate(expected):
+            found = self.command.find_span(spans, cur)
+            if found is not None:
+                found[1].pop("is_dir", None)
+                found = tuple(found)
+            self.assertEqual(found, (path, info) if path else None,
+                             "cur={}".format(cur))
+
+    def test_scanned_lines(self):
+        """Testing all paths within a line longer than the context."""
+        long_dir = "/root/dir1/" + "a_rather_long_directory_name" * 8
+        self.virtual_files = self.virtual_files + [long_dir + "/file3.txt"]
+        self.paths = self.paths | {long_dir, long_dir + "/file3.txt"}
+
+        line = ("at {}/file3.txt:12 and dir2/sub/file2.txt, not in "
+                "dir1/missing.txt or /root/dir1/file1.txt:3:4".format(
+                    long_dir))
+        settings = self.get_settings()
+        self.assertGreater(len(long_dir), 2 * settings.context)
+
+        with self.virtual_file_system():
+            self.command.use_settings(settings)
+            scanned = list(self.command.scan_line(line, settings))
+            extracted = self.command.extract_paths(
+                line, self.directories)
+
+            # the paths found with the cursor at every position of the line
+            expected = []
+            for result in self.extract_all_cursors(line):
+                if result[0] is not None and result not in expected:
+                    expected.append(result)
+
+        for path, info in scanned:
+            info.pop("is_dir", None)
+
+        self.assertEqual(scanned, expected)
+        self.assertEqual([path for path, scope in extracted],
+                         [path for path, info in expected])
+        self.assertEqual([path for path, info in expected], [
+            long_dir + "/file3.txt", "/root/dir2/sub/file2.txt",
+            "/root/dir1/", "/root/dir1/file1.txt"])
+
+    def test_open_all_paths(self):
+        """Testing the paths opened from all lines of a view."""
+        view = self.create_view(
+            "src: /root/dir1/file1.txt:1\n"
+            "then dir2/sub/file2.txt:2:3 and /root/dir1/file1.txt:4\n"
+            "no paths")
+        finder = self.create_command(view)
+        command = OpenAllContextPathsCommand(view)
+        slices = []
+
+        with self.virtual_file_system(), \
+                mock.patch.object(command, "slice_budget", 0), \
+                mock.patch.object(sublime, "set_timeout_async",
+                                  lambda function, delay: slices.append(
+                                      function)), \
+                mock.patch.object(sublime, "set_timeout",
+                                  lambda function, delay: function()), \
+                mock.patch("OpenContextPath.open_context_path."
+                           "OpenContextPathCommand", lambda view: finder), \
+                mock.patch.object(finder, "open_paths") as open_paths:
+            command.run(None, show_panel=False)
+
+            # each slice searches a single line and queues the next one
+            for i in range(3):
+                self.assertEqual(len(slices), 1)
+                slices.pop()()
+                self.assertEqual(open_paths.called, i == 2)
+
+        # each path is kept once with the first position it was found at
+        paths = open_paths.call_args[0][0]
+        self.assertEqual([(path, info.get("line")) for path, info in paths], [
+            ("/root/dir1/file1.txt", "1"), ("/root/dir2/sub/file2.txt", "2")])
+
+        with mock.patch.object(os, 'path', self.path_module), \
+                mock.patch("OpenContextPath.open_context_path."
+                           "OpenContextPathCommand", lambda view: finder):
+            command.show_paths(paths, show_panel=False)
+
+        self.assertEqual(view.window().open_file.call_args_list, [
+            mock.call("/root/dir1/file1.txt:1", sublime.ENCODED_POSITION),
+            mock.call("/root/dir2/sub/file2.txt:2:3",
+                      sublime.ENCODED_POSITION)])
+
+    def test_open_all_paths_long_line(self):
+        """Testing that long lines are searched in windows after words."""
+        view = self.create_view("{} /root/dir1/file1.txt:1 dir2/sub/"
+                                "file2.txt:2".format("x" * 170))
+        finder = self.create_command(view)
+        command = OpenAllContextPathsCommand(view)
+        settings = finder.get_settings()._replace(max_context=100)
+
+        with self.virtual_file_system():
+            paths = OrderedDict()
+            rest = command.scan_slice(
+                view, [sublime.Region(0, view.size())], finder, settings, 0,
+                0, paths)
+
+        self.assertIsNone(rest)
+        self.assertEqual(list(paths), [
+            "/root/dir1/file1.txt", "/root/dir2/sub/file2.txt"])
+
+        # the text is read in windows that end after a word
+        self.assertEqual([args[0].size() for args, kwargs in
+                          view.substr.call_args_list], [200, 20])
+
+    def test_ambiguous_paths(self):
+        """Testing that ambiguous paths are chosen one after another."""
+        view = self.create_view("see ^a.txt and ^b.txt and ^/root/c.txt")
+        command = self.create_command(view)
+        window = view.window()
+
+        paths = [
+            ("/root/dir1/a.txt", {"alternatives": [
+                "/root/dir1/a.txt", "/root/dir2/a.txt"]}),
+            ("/root/dir1/b.txt", {"line": "2", "alternatives": [
+                "/root/dir1/b.txt", "/root/dir2/b.txt"]}),
+            ("/root/c.txt", {})]
+
+        with mock.patch.object(command, "find_paths", lambda event: paths), \
+                mock.patch.object(sublime, "set_timeout",
+                                  lambda function, delay: function()):
+            command.run(None)
+            window.open_file.assert_called_once_with(
+                "/root/c.txt", sublime.ENCODED_POSITION)
+
+            # the next panel is only shown after the first one was closed
+            (items, on_select), kwargs = window.show_quick_panel.call_args
+            self.assertEqual(items, [["a.txt", "/root/dir1/a.txt"],
+                                     ["a.txt", "/root/dir2/a.txt"]])
+            on_select(-1)
+
+            self.assertEqual(window.show_quick_panel.call_count, 2)
+            (items, on_select), kwargs = window.show_quick_panel.call_args
+            on_select(1)
+
+        self.assertEqual(window.show_quick_panel.call_count, 2)
+        window.open_file.assert_called_with(
+            "/root/dir2/b.txt:2", sublime.ENCODED_POSITION)
+
+    def test_reused_results(self):
+        """Testing that the context menu searches for the paths only once."""
+        view = self.create_view("see /root/dir1/^file1.txt:42")
+        command = self.create_command(view)
+
+        with self.virtual_file_system(), \
+                mock.patch.object(command, "find_paths_at",
+                                  wraps=command.find_paths_at) as find:
+            self.assertTrue(command.is_visible())
+            self.assertTrue(command.is_enabled())
+            self.assertEqual(command.description(),
+                             "Open file1.txt at line 42")
+            self.assertEqual(find.call_count, 1)
+
+            # changing the text or the settings starts a new search
+            view.change_count.return_value = 1
+            self.assertTrue(command.is_visible())
+            self.assertEqual(find.call_count, 2)
+
+            update_settings()
+            self.assertTrue(command.is_visible())
+            self.assertEqual(find.call_count, 3)
+
+    def test_prefetched_path(self):
+        """Testing that the path shown in the context menu is prefetched."""
+        view = self.create_view("see /root/dir1/^file1.txt:42")
+        view.settings()["open_context_path"]["prefetch_limit"] = 2
+        command = self.create_command(view)
+
+        with self.virtual_file_system(), \
+                mock.patch.object(command, "find_paths_at",
+                                  wraps=command.find_paths_at) as find, \
+                mock.patch("OpenContextPath.open_context_path.prefetcher") \
+                as prefetcher, \
+                mock.patch("OpenContextPath.open_context_path."
+                           "result_timeout", 0):
+            self.assertEqual(command.description(),
+                             "Open file1.txt at line 42")
+            prefetcher.prefetch.assert_called_once_with(
+                "/root/dir1/file1.txt", 2 * 1024 * 1024)
+
+            # the result shown in the menu is kept while the menu is open
+            self.assertTrue(command.is_enabled())
+            self.assertEqual(find.call_count, 1)
+
+            # but other results are searched again
+            view.change_count.return_value = 1
+            self.assertTrue(command.is_enabled())
+            self.assertTrue(command.is_enabled())
+            self.assertEqual(find.call_count, 3)
+
+    def test_settings_snapshot(self):
+        """Testing that the settings are only read again when they change."""
+        view = self.create_view("^")
+        command = self.create_command(view)
+
+        with mock.patch.object(command, "get_directories",
+                               wraps=command.get_directories) as get:
+            settings = command.get_settings()
+            self.assertEqual(settings.directories, self.directories)
+            self.assertIs(command.get_settings(), settings)
+            self.assertEqual(get.call_count, 1)
+
+            # changing the settings of the view creates a new snapshot
+            view.settings().set("open_context_path", {
+                "directories": ["/root/dir1"]
+            })
+            settings = command.get_settings()
+            self.assertEqual(settings.directories, ("/root/dir1",))
+            self.assertIs(command.get_settings(), settings)
+            self.assertEqual(get.call_count, 2)
+
+    def test_settings_after_save(self):
+        """Testing that the settings are read again after saving a view."""
+        view = self.create_view("^")
+        view.settings().set("open_context_path", {
+            "directories": ["${file_path}"]
+        })
+        window = view.window()
+        window.extract_variables.return_value = {"file_path": "/root/dir1"}
+        command = self.create_command(view)
+        self.assertEqual(command.get_settings().directories, ("/root/dir1",))
+
+        # the view was saved in another directory
+        window.extract_variables.return_value = {"file_path": "/root/dir2"}
+        OpenContextPathListener().on_post_save(view)
+        self.assertEqual(command.get_settings().directories, ("/root/dir2",))
+
+    def test_multiple_cursors(self):
+        """Testing many cursors with a single search of each line."""
+        filler = "some text without any paths, " * 20
+        view = self.create_view(
+            "/root/dir1/^file1.txt:1 and dir2/^sub/file2.txt\n"
+            "/root/dir1/fi^le1.txt:1 and dir2/sub/file^2.txt\n"
+            "nothing ^here\n"
+            "{0}dir2/sub/^file2.txt:7 and /root/dir1/^file1.txt {0}".format(
+                filler))
+        command = self.create_command(view)
+        points = [region.a for region in view.sel()]
+
+        with self.virtual_file_system():
+            # the paths found at each cursor on its own
+            expected = []
+            for point in points:
+                for result in command.find_paths_at([point]):
+                    if result not in expected:
+                        expected.append(result)
+
+            clear_caches()
+            with mock.patch.object(command, "scan_text",
+                                   wraps=command.scan_text) as scan_text:
+                paths = command.find_paths_at(points)
+
+        self.assertEqual(paths, expected)
+        self.assertEqual([path for path, info in paths], [
+            "/root/dir1/file1.txt", "/root/dir2/sub/file2.txt",
+            "/root/dir2/sub/file2.txt", "/root/dir1/file1.txt"])
+
+        # the first two lines are the same and both cursors of the long line
+        # are within the same part of it
+        self.assertEqual(scan_text.call_count, 3)
+
+    def test_grown_window(self):
+        """Testing the text around cursors on long lines."""
+        filler = "x" * 300
+        view = self.create_view(
+            "{0} ('/root/dir1/file1.txt', 'some dir/sub dir/fi^le') {0}"
+            .format(filler))
+        command = self.create_command(view)
+        point = view.sel()[0].a
+        line = view.line(point)
+
+        # the text starts with the words that were cut off
+        begin, upper = command.grow_window(line, point - 10, [point], 100)
+        self.assertEqual(view.substr(sublime.Region(begin, point)),
+                         "some dir/sub dir/fi")
+        self.assertEqual(upper, point + 100)
+
+        # but it never grows beyond max_context
+        begin, upper = command.grow_window(line, point - 10, [point], 15)
+        self.assertEqual((begin, upper), (point - 15, point + 15))
+
+        begin, upper = command.grow_window(line, point - 10, [point], 1000)
+        self.assertEqual(upper, line.b)
+
+    def test_long_paths(self):
+        """Testing paths on long lines that reach beyond the context."""
+        long_dir = "/root/dir1/" + "a_rather_long_directory_name" * 8
+        self.virtual_files = self.virtual_files + [long_dir + "/file3.txt"]
+        self.paths = self.paths | {long_dir, long_dir + "/file3.txt"}
+
+        filler = "some text without any paths, " * 200
+        view = self.create_view(
+            "{0}^{1}/file3.txt {0}".format(filler, long_dir))
+        command = self.create_command(view)
+
+        with self.virtual_file_system(), \
+                mock.patch.object(command, "scan_text",
+                                  wraps=command.scan_text) as scan_text:
+            self.assertEqual([path for path, info in command.find_paths_at(
+                [view.sel()[0].a])], [long_dir + "/file3.txt"])
+
+        # the text is only grown as far as the path reaches
+        texts = [args[0] for args, kwargs in scan_text.call_args_list]
+        self.assertGreater(len(texts), 1)
+        self.assertLess(len(texts[-1]), 1000)
+
+        # the position after a path is found even if the text ends within it
+        path = long_dir + "/file3.txt"
+        view = self.create_view("{0}{1}^{2}:12:3 {0}".format(
+            filler, path[:-99], path[-99:]))
+        command = self.create_command(view)
+
+        with self.virtual_file_system():
+            self.assertEqual(command.find_paths_at([view.sel()[0].a]), [
+                (path, {"line": "12", "col": "3"})])
+
+    def test_unrelated_parents(self):
+        """Testing that parent references after a path don't slow it down."""
+        view = self.create_view("see /root/dir1/^file1.txt:42 {}".format(
+            "f(...args);$(x).y('a b');" * 400))
+        command = self.create_command(view)
+
+        checked = []
+        path_exists = self.path_exists
+
+        def exists(path):
+            checked.append(path)
+            return path_exists(path)
+
+        self.path_exists = exists
+        with self.virtual_file_system():
+            self.assertEqual([path for path, info in command.find_paths_at(
+                [view.sel()[0].a])], ["/root/dir1/file1.txt"])
+
+        self.assertLess(len(checked), 50)
+
+    def test_indexed_paths(self):
+        """Testing relative paths with indexed directories."""
+        with mock.patch.object(os, 'path', self.path_module):
+            self.index_directories()
+
+        self.test_relative_paths()
+
+    def test_case_insensitive_index(self):
+        """Testing an index on macOS, which ignores the case of names."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        os.mkdir(os.path.join(temp_dir.name, "Src"))
+        with open(os.path.join(temp_dir.name, "Src", "Main.c"), "w"):
+            pass
+
+        with mock.patch("sys.platform", "darwin"):
+            dir_index = DirectoryIndex(temp_dir.name, ttl=60, limit=1000)
+            dir_index.build()
+
+            self.assertTrue(dir_index.exists("src/MAIN.c"))
+            self.assertTrue(dir_index.has_prefix("SRC/ma"))
+            self.assertFalse(dir_index.exists("src/util.c"))
+
+    def test_classified_paths(self):
+        """Testing whether found paths are known to be directories."""
+        with mock.patch.object(os, 'path', self.path_module):
+            self.index_directories()
+
+            for path, is_dir in [
+                    ("/root/dir1", True),
+                    ("/root/dir2/sub/file2.txt", False),
+                    ("/root/dir2/sub/", True),
+                    ("/elsewhere/file.txt", None)]:
+                info = {}
+                self.command.classify_path(path, info)
+                self.assertEqual(info.get("is_dir"), is_dir, path)
+
+    def test_indexed_names(self):
+        """Testing bare names and partial paths with a name index."""
+        self.directories = ("/root/dir2",)
+        self.index_names(("/root",))
+        self.extract_paths([
+            ("file^2.txt:42", "/root/dir2/sub/file2.txt",
+             {"line": "42", "col": None}),
+            ("sub/file^2.txt", "/root/dir2/sub/file2.txt"),
+            ("dir1/file^1.txt", "/root/dir1/file1.txt"),
+            ("root/dir1/file^1.txt", "/root/dir1/file1.txt"),
+            ("nodir/file^1.txt", "/root/dir1/file1.txt"),
+            ("file^3.txt", None)
+        ])
+
+        # ambiguous names can be chosen from unless they are found in the
+        # directories
+        with mock.patch.object(os, 'path', self.path_module):
+            self.assertEqual(
+                self.command.find_alternatives(
+                    "file1.txt", "/root/dir1/file1.txt", self.directories),
+                ["/root/dir1/file1.txt", "/root/dir1/root/dir1/file1.txt"])
+            self.assertEqual(
+                self.command.find_alternatives(
+                    "sub/file2.txt", "/root/dir2/sub/file2.txt",
+                    self.directories),
+                [])
+
+    def test_git_index(self):
+        """Testing directories within a git repository."""
+        self.directories = ("/root", "/root/dir2")
+
+        # dir1/file1.txt is tracked, dir2/sub/file2.txt is untracked and
+        # dir1/root is ignored
+        def ls_files(repository, *args):
+            if "--cached" in args:
+                return ["100644 0123456789 0\tdir1/file1.txt"]
+            elif "--ignored" in args:
+                return ["dir1/root/"]
+            elif "--deleted" in args:
+                return []
+            else:
+                return ["dir2/sub/file2.txt"]
+
+        # remember all lookups on disk
+        checked = []
+        path_exists = self.path_exists
+
+        def exists(path):
+            checked.append(path)
+            return path_exists(path)
+
+        self.path_exists = exists
+
+        with mock.patch.object(os, 'path', self.path_module), \
+                mock.patch("OpenContextPath.index.GitRepository.run",
+                           ls_files), \
+                mock.patch("OpenContextPath.index.get_mtime",
+                           lambda path: 0):
+            repository = GitRepository("/root", "/root/.git", ttl=60,
+                                       untracked=True)
+            repository.build()
+            self.command.indexes = {
+                dir: GitIndex(dir, repository) for dir in self.directories
+            }
+
+            self.extract_paths([
+                ("dir1/file^1.txt", "/root/dir1/file1.txt"),
+                ("sub/file^2.txt", "/root/dir2/sub/file2.txt"),
+                ("dir1/file^2.txt", None)
+            ])
+            self.assertEqual(checked, [])
+
+            # ignored files are checked on disk
+            self.extract_paths([
+                ("dir1/root/dir1/file^1.txt",
+                 "/root/dir1/root/dir1/file1.txt")
+            ])
+            self.assertIn("/root/dir1/root/dir1/file1.txt", checked)
+
+    def test_git_index_unknown(self):
+        """Testing paths a git repository can't vouch for."""
+        self.directories = ("/root",)
+
+        # dir1/file1.txt and dir2/file3.txt are tracked but dir2/file3.txt
+        # was deleted, untracked files are not listed
+        def ls_files(repository, *args):
+            if "--cached" in args:
+                return ["100644 0123456789 0\tdir1/file1.txt",
+                        "100644 0123456789 0\tdir2/file3.txt"]
+            elif "--deleted" in args:
+                return ["dir2/file3.txt"]
+            else:
+                return []
+
+        # remember all lookups on disk
+        checked = []
+        path_exists = self.path_exists
+
+        def exists(path):
+            checked.append(path)
+            return path_exists(path)
+
+        self.path_exists = exists
+
+        with mock.patch.object(os, 'path', self.path_module), \
+                mock.patch("OpenContextPath.index.GitRepository.run",
+                           ls_files), \
+                mock.patch("OpenContextPath.index.get_mtime",
+                           lambda path: 0):
+            repository = GitRepository("/root", "/root/.git", ttl=60,
+                                       untracked=False)
+            repository.build()
+            index = GitIndex("/root", repository)
+
+            self.assertTrue(index.exists("dir1/file1.txt"))
+            self.assertIsNone(index.exists("dir2/file3.txt"))
+            self.assertIsNone(index.exists("dir2/sub/file2.txt"))
+            self.assertIsNone(index.has_prefix("dir2/su"))
+
+            self.command.indexes = {"/root": index}
+            self.extract_paths([
+                ("dir1/file^1.txt", "/root/dir1/file1.txt"),
+                ("dir2/sub/file^2.txt", "/root/dir2/sub/file2.txt"),
+                ("dir2/file^3.txt", None)
+            ])
+            self.assertNotIn("/root/dir1/file1.txt", checked)
+            self.assertIn("/root/dir2/sub/file2.txt", checked)
+            self.assertIn("/root/dir2/file3.txt", checked)
+
+    def test_stored_names(self):
+        """Testing that the name index is only updated after a restart."""
+        self.mtimes = {}
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.index_names(("/root",), cache_dir)
+            self.assertEqual(len(self.listed), 6)
+
+            # only the changed directory is read again
+            self.mtimes["/root/dir2"] = 1
+            self.index_names(("/root",), cache_dir)
+            self.assertEqual(self.listed, ["/root/dir2"])
+
+            self.index_names(("/root",), cache_dir)
+            self.assertEqual(self.listed, [])
+
+        self.directories = ()
+        self.extract_paths([
+            ("file^2.txt", "/root/dir2/sub/file2.txt")
+        ])
+
+    def test_slow_directories(self):
+        """Testing that slow directories are skipped."""
+        self.directories = ("/slow", "/root/dir2/")
+        self.addCleanup(prober.slow.clear)
+
+        # pretend that every lookup in /slow takes a while
+        calls = []
+
+        def slow(func):
+            def probe(path):
+                if path.startswith("/slow"):
+                    calls.append(path)
+                    time.sleep(0.5)
+                return func(path)
+            return probe
+
+        self.path_exists = slow(self.path_exists)
+        self.list_directory = slow(self.list_directory)
+
+        # the path in the fast directory is found once the time is up
+        self.command.timeout = 0.1
+        start = time.monotonic()
+        self.extract_paths([
+            ("sub/file^2.txt", "/root/dir2/sub/file2.txt")
+        ])
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertTrue(prober.is_slow("/slow"))
+
+        # the slow directory isn't touched again
+        del calls[:]
+        self.extract_paths([
+            ("sub/file^2.txt", "/root/dir2/sub/file2.txt"),
+            ("file^2.txt", None)
+        ])
+        self.assertEqual(calls, [])
+
+        # not even after the penalty while the last probe is still running
+        prober.slow.clear()
+        self.extract_paths([
+            ("sub/file^2.txt", "/root/dir2/sub/file2.txt")
+        ])
+        self.assertEqual(calls, [])
+        self.assertTrue(prober.is_slow("/slow"))
+
+        time.sleep(0.6)
+        self.assertFalse(prober.is_slow("/slow"))
+
+    def test_probe_budget(self):
+        """Testing that all lookups of a command share the time limit."""
+        self.directories = ("/slow", "/root/dir2/")
+        self.addCleanup(prober.slow.clear)
+
+        # every lookup in /slow takes a while but stays within the limit
+        def slow(func):
+            def probe(path):
+                if path.startswith("/slow"):
+                    time.sleep(0.05)
+                return func(path)
+            return probe
+
+        self.path_exists = slow(self.path_exists)
+        self.list_directory = slow(self.list_directory)
+
+        view = self.create_view(
+            "^sub/file2.txt ^dir1/file1.txt ^sub/sub/file2.txt ^file2.txt")
+        view.settings().set("open_context_path", {
+            "directories": list(self.directories),
+            "probe_timeout": 100
+        })
+        command = self.create_command(view)
+
+        with self.virtual_file_system():
+            start = time.monotonic()
+            command.find_paths_at([region.a for region in view.sel()])
+            self.assertLess(time.monotonic() - start, 0.3)
+
+    def test_directory_globs(self):
+        """Testing patterns within the directories."""
+        self.mtimes = {}
+        self.listed = []
+
+        def is_dir(path):
+            return any(file.startswith(os.path.join(path, ""))
+                       for file in self.virtual_files)
+
+        with mock.patch.object(os, 'path', self.path_module), \
+                mock.patch("os.path.isdir", is_dir), \
+                mock.patch("OpenContextPath.index.list_directory",
+                           self.list_entries), \
+                mock.patch("OpenContextPath.index.get_mtime",
+                           lambda path: self.mtimes.get(path, 0)):
+            glob = DirectoryGlob("/root/**/dir1", ttl=60, limit=1000,
+                                 excludes=[])
+
+            # the first matches are found in the background
+            generation = index.glob_generation
+            with mock.patch("threading.Thread") as thread:
+                self.assertEqual(glob.get(), ())
+                thread.assert_called_once_with(target=glob.build, daemon=True)
+
+            glob.build()
+            self.assertEqual(index.glob_generation, generation + 1)
+            self.assertEqual(glob.get(),
+                             ("/root/dir1", "/root/dir1/root/dir1"))
+
+            # only the changed directory is read again
+            del self.listed[:]
+            self.mtimes["/root/dir1"] = 1
+            glob.build()
+            self.assertEqual(self.listed, ["/root/dir1"])
+
+            self.assertEqual(DirectoryGlob("/root/dir?/", ttl=60, limit=1000,
+                                           excludes=[]).get(wait=True),
+                             ("/root/dir1", "/root/dir2"))
+            self.assertEqual(DirectoryGlob("/root/*/sub", ttl=60, limit=1000,
+                                           excludes=[]).get(wait=True),
+                             ("/root/dir2/sub",))
+            self.assertEqual(DirectoryGlob("/root/**/dir1", ttl=60, limit=1000,
+                                           excludes=["root"]).get(wait=True),
+                             ("/root/dir1",))
+
+            self.directories = glob.get()
+
+        self.extract_paths([
+            ("file^1.txt", "/root/dir1/file1.txt"),
+            ("root/dir1/file^1.txt", "/root/dir1/root/dir1/file1.txt"),
+            ("sub/file^2.txt", None)
+        ])
+
     def test_relative_paths(self):
         """Testing relative paths."""
         self.extract_paths([
@@ -154,6 +1012,7 @@ class TestPathsWindows(BaseTestCase):
 
     # the path module we need for these tests
     path_module = ntpath
+    separator = "\\"
 
     # a list of files for which we pretend that they exist
     virtual_files = [
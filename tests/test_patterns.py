@@ -0,0 +1,78 @@
+"""Test pattern matching."""
+
+from unittest import TestCase
+
+from OpenContextPath.patterns import PatternMatcher
+
+
+class TestPatterns(TestCase):
+    """Test matching additional information after a path."""
+
+    # the default patterns
+    patterns = [
+        ":(?P<line>\\d+)(?::(?P<col>\\d+))?",
+        "[\"'], line (?P<line>\\d+)"
+    ]
+
+    def match_patterns(self, patterns, tests):
+        """Match multiple texts and compare the results."""
+        matcher = PatternMatcher(patterns)
+        for text, info in tests:
+            self.assertEqual(matcher.match(text), info, "text={}".format(text))
+
+    def test_default_patterns(self):
+        """Testing the default patterns."""
+        self.assertIsNotNone(PatternMatcher(self.patterns).fused)
+        self.match_patterns(self.patterns, [
+            (":42:10", {"line": "42", "col": "10"}),
+            (":42", {"line": "42", "col": None}),
+            ("', line 42", {"line": "42"}),
+            ("\", line 42:10", {"line": "42"}),
+            (" line 42", {}),
+            ("", {})
+        ])
+
+    def test_pattern_order(self):
+        """Testing that the first matching pattern wins."""
+        self.match_patterns([
+            "\\((?P<line>\\d+)\\)",
+            "\\((?P<line>\\d+),(?P<col>\\d+)\\)",
+            "\\((?P<col>\\d+)"
+        ], [
+            ("(42)", {"line": "42"}),
+            ("(42,10)", {"line": "42", "col": "10"}),
+            ("(42", {"col": "42"})
+        ])
+
+    def test_unfusable_patterns(self):
+        """Testing patterns that can't be combined."""
+        patterns = [
+            "(['\"])(?P<line>\\d+)\\1",
+            ":(?P<line>\\d+)"
+        ]
+        self.assertIsNone(PatternMatcher(patterns).fused)
+        self.match_patterns(patterns, [
+            ("'42'", {"line": "42"}),
+            ("'42\"", {}),
+            (":42", {"line": "42"})
+        ])
+
+    def test_named_references(self):
+        """Testing patterns with references to named groups."""
+        self.match_patterns([
+            "(?P<quote>['\"])(?P<line>\\d+)(?P=quote)",
+            ":(?P<line>\\d+)"
+        ], [
+            ("'42'", {"quote": "'", "line": "42"}),
+            ("'42\"", {}),
+            (":42", {"line": "42"})
+        ])
+
+    def test_invalid_patterns(self):
+        """Testing that invalid patterns are ignored."""
+        self.match_patterns([
+            "(?P<line>\\d+",
+            ":(?P<line>\\d+)"
+        ], [
+            (":42", {"line": "42"})
+        ])
@@ -0,0 +1,56 @@
+"""Test reading files ahead of opening them."""
+
+import os
+import tempfile
+
+from unittest import mock, skipUnless, TestCase
+
+from OpenContextPath.prefetch import Prefetcher
+
+
+class TestPrefetcher(TestCase):
+    """Test prefetching files in the background."""
+
+    def setUp(self):
+        """Create a file to prefetch."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+
+        self.dir = temp_dir.name
+        self.path = os.path.join(temp_dir.name, "build.log")
+        with open(self.path, "wb") as file:
+            file.write(b"x" * 100)
+
+        self.prefetcher = Prefetcher()
+        self.prefetcher.chunk_size = 16
+        self.addCleanup(self.prefetcher.shutdown)
+
+    def test_prefetch(self):
+        """Testing that files are read once up to the limit."""
+        with mock.patch("builtins.open", wraps=open) as opened:
+            self.prefetcher.read(self.path, 40)
+            self.prefetcher.read(self.path, 40)
+            self.assertEqual(opened.call_count, 1)
+
+            # changed files are read again
+            with open(self.path, "ab") as file:
+                file.write(b"x")
+            self.prefetcher.read(self.path, 40)
+            self.assertEqual(opened.call_count, 3)
+
+    def test_missing_file(self):
+        """Testing that missing files are ignored."""
+        path = self.path + ".missing"
+        self.prefetcher.reading.add(path)
+        self.prefetcher.read(path, 40)
+        self.assertEqual(self.prefetcher.reading, set())
+
+    @skipUnless(hasattr(os, "mkfifo"), "requires FIFOs")
+    def test_special_file(self):
+        """Testing that only regular files are read."""
+        path = os.path.join(self.dir, "fifo")
+        os.mkfifo(path)
+
+        with mock.patch("builtins.open", wraps=open) as opened:
+            self.prefetcher.read(path, 40)
+            opened.assert_not_called()
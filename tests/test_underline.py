@@ -0,0 +1,162 @@
+"""Test underlining the paths in the visible part of a view."""
+
+import itertools
+import os
+import tempfile
+
+from unittest import mock, TestCase
+
+import sublime
+
+from OpenContextPath import underline
+from OpenContextPath.open_context_path import clear_caches, update_settings
+
+
+class TestUnderline(TestCase):
+    """Test finding and underlining the paths of views."""
+
+    # the ids of all views created by the tests
+    view_ids = itertools.count(2000)
+
+    def setUp(self):
+        """Create a directory with some files and run all timeouts at once."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = temp_dir.name
+
+        os.mkdir(os.path.join(self.dir, "src"))
+        for name in ["f1.txt", "f2.txt", "f3.txt"]:
+            with open(os.path.join(self.dir, "src", name), "w"):
+                pass
+
+        # the checks whether a view was scrolled are run by the tests
+        self.polls = []
+        for patcher in [
+                mock.patch.object(sublime, "set_timeout", self.run_later),
+                mock.patch.object(sublime, "set_timeout_async", self.run_now),
+                mock.patch.dict(underline.underliners, clear=True)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        clear_caches()
+
+    @staticmethod
+    def run_now(function, delay=0):
+        """Run a function at once instead of after a delay."""
+        function()
+
+    def run_later(self, function, delay=0):
+        """Run a function at once unless it polls the view."""
+        if delay == underline.poll_interval:
+            self.polls.append(function)
+        else:
+            function()
+
+    def create_view(self, text):
+        """Create a view showing a text with underlining enabled."""
+        view = mock.Mock()
+        view.text = text
+        view.id.return_value = next(self.view_ids)
+        view.is_valid.return_value = True
+        view.change_count.return_value = 0
+        view.visible_region.side_effect = \
+            lambda: sublime.Region(0, len(view.text))
+        view.substr.side_effect = \
+            lambda region: view.text[region.begin():region.end()]
+
+        def lines(region):
+            begin = 0
+            for line in view.text.split("\n"):
+                yield sublime.Region(begin, begin + len(line))
+                begin += len(line) + 1
+        view.lines.side_effect = lambda region: list(lines(region))
+
+        view.options = {"directories": [self.dir], "underline_paths": True}
+        view.settings.return_value.get.side_effect = \
+            {"open_context_path": view.options}.get
+
+        window = view.window.return_value
+        window.active_view.return_value = view
+        window.num_groups.return_value = 1
+        window.active_view_in_group.return_value = view
+        window.folders.return_value = []
+        window.extract_variables.return_value = {}
+        window.project_file_name.return_value = None
+
+        # forget about the snapshots of other tests
+        update_settings()
+        return view
+
+    def get_underlined(self, view):
+        """Get the underlined texts of a view."""
+        args, kwargs = view.add_regions.call_args
+        self.assertEqual(args[0], underline.region_key)
+        return [view.substr(region) for region in args[1]]
+
+    def test_underline(self):
+        """Testing the underlining of the paths in the visible lines."""
+        view = self.create_view(
+            "see src/f1.txt:3 and src/f2.txt\nnothing here\n"
+            "{} src/f3.txt\nmissing lib/f4.txt".format("x" * 300))
+        underline.UnderlineListener().on_activated(view)
+
+        # long lines are skipped
+        self.assertEqual(self.get_underlined(view),
+                         ["src/f1.txt", "src/f2.txt"])
+
+    def test_changed_lines(self):
+        """Testing that only new or changed lines are searched again."""
+        view = self.create_view("see src/f1.txt\nand src/f2.txt")
+        underliner = underline.get_underliner(view)
+        underliner.schedule()
+
+        with mock.patch.object(underliner.finder, "resolve_line",
+                               wraps=underliner.finder.resolve_line) as \
+                resolve_line:
+            view.text = "new src/f3.txt\n" + view.text
+            view.change_count.return_value = 1
+            underliner.schedule()
+
+            self.assertEqual([args[0] for args, kwargs in
+                              resolve_line.call_args_list],
+                             ["new src/f3.txt"])
+
+        self.assertEqual(self.get_underlined(view),
+                         ["src/f3.txt", "src/f1.txt", "src/f2.txt"])
+
+    def test_disabled(self):
+        """Testing that the underlines are removed when disabled."""
+        view = self.create_view("see src/f1.txt")
+        underline.UnderlineListener().on_activated(view)
+        self.assertEqual(self.get_underlined(view), ["src/f1.txt"])
+        view.erase_regions.assert_not_called()
+
+        # the view is polled while underlining is enabled
+        self.polls.pop()()
+        self.assertEqual(len(self.polls), 1)
+
+        view.options["underline_paths"] = False
+        self.polls.pop()()
+        view.erase_regions.assert_called_with(underline.region_key)
+        self.assertEqual(self.polls, [])
+
+    def test_save(self):
+        """Testing that only the visible views are searched after saving."""
+        visible_view = self.create_view("see src/f1.txt")
+        hidden_view = self.create_view("see src/f1.txt")
+        hidden_view.window().active_view_in_group.return_value = visible_view
+
+        listener = underline.UnderlineListener()
+        for view in [visible_view, hidden_view]:
+            listener.on_activated(view)
+            view.add_regions.reset_mock()
+
+        listener.on_post_save(visible_view)
+        visible_view.add_regions.assert_called_once_with(
+            underline.region_key, mock.ANY, mock.ANY, flags=mock.ANY)
+        hidden_view.add_regions.assert_not_called()
+
+        # the hidden view is searched again once it is activated
+        listener.on_activated(hidden_view)
+        hidden_view.add_regions.assert_called_once_with(
+            underline.region_key, mock.ANY, mock.ANY, flags=mock.ANY)
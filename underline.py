@@ -0,0 +1,218 @@
+"""Underline all paths in the visible part of a view."""
+
+import time
+
+import sublime
+import sublime_plugin
+
+from . import cache
+from . import open_context_path
+
+
+# the key of the underlined regions
+region_key = "open_context_path"
+
+# the number of milliseconds to wait after the last change before searching
+# for paths and between checks whether a view was scrolled
+debounce_delay = 100
+poll_interval = 250
+
+# the number of seconds to search for paths before giving other work a chance
+frame_budget = 0.008
+
+# the underliners of all views by the id of the view
+underliners = {}
+
+
+class PathUnderliner:
+    """Find and underline the paths in the visible part of a view.
+
+    The scopes of the paths are remembered for the text of each line so only
+    new or changed lines need to be searched again.
+    """
+
+    def __init__(self, view):
+        """Initialize the underliner."""
+        self.view = view
+        self.finder = open_context_path.OpenContextPathCommand(view)
+
+        stat_cache = open_context_path.stat_cache
+        self.lines = cache.TimedCache(size=stat_cache.size // 10,
+                                      ttl=stat_cache.ttl)
+        self.generation = open_context_path.settings_generation
+
+        # the number of searches that were requested so far (to ignore all but
+        # the last one) and the visible region of the last search
+        self.requests = 0
+        self.visible = None
+        self.polling = False
+
+    def is_enabled(self):
+        """Whether paths should be underlined in the view."""
+        return self.finder.get_setting("underline_paths", False)
+
+    def schedule(self):
+        """Search for paths once the view hasn't changed for a while."""
+        self.requests += 1
+        request = self.requests
+
+        def run():
+            if request == self.requests:
+                self.start(request)
+
+        sublime.set_timeout(run, debounce_delay)
+
+    def start_polling(self):
+        """Check whether the view is scrolled while it is active."""
+        if not self.polling:
+            self.polling = True
+            sublime.set_timeout(self.poll, poll_interval)
+
+    def poll(self):
+        """Search for paths if the view was scrolled."""
+        view = self.view
+        if not view.is_valid():
+            self.polling = False
+            return
+
+        if not self.is_enabled():
+            view.erase_regions(region_key)
+            self.polling = False
+            return
+
+        window = view.window()
+        if window is None or window.active_view() != view:
+            self.polling = False
+            return
+
+        if view.visible_region() != self.visible:
+            self.schedule()
+
+        sublime.set_timeout(self.poll, poll_interval)
+
+    def start(self, request):
+        """Start searching for paths in the visible lines."""
+        view = self.view
+        if not view.is_valid():
+            return
+
+        if not self.is_enabled():
+            view.erase_regions(region_key)
+            return
+
+        # the settings need to be loaded in the main thread
+        settings = self.finder.get_settings()
+        if self.generation != open_context_path.settings_generation:
+            self.generation = open_context_path.settings_generation
+            self.lines.clear()
+
+        self.visible = view.visible_region()
+        lines = view.lines(self.visible)
+        change_count = view.change_count()
+
+        sublime.set_timeout_async(lambda: self.scan(
+            request, change_count, settings, lines, 0, []), 0)
+
+    def scan(self, request, change_count, settings, lines, i, regions):
+        """Search for paths in some lines and underline them when done.
+
+        The search is continued later whenever it took longer than the frame
+        budget.
+        """
+        view = self.view
+        finder = self.finder
+        finder.use_settings(settings)
+
+        deadline = time.perf_counter() + frame_budget
+        while i < len(lines):
+            # stop if the view changed or another search was requested
+            if request != self.requests or \
+                    view.change_count() != change_count:
+                return
+
+            if time.perf_counter() > deadline:
+                sublime.set_timeout_async(lambda: self.scan(
+                    request, change_count, settings, lines, i, regions), 0)
+                return
+
+            # long lines are only searched around the cursor
+            line = lines[i]
+            i += 1
+            if line.size() > 2 * settings.context:
+                continue
+
+            text = view.substr(line)
+            scopes = self.lines.get(text)
+            if scopes is None:
+                starts, results, scopes = finder.resolve_line(text, settings)
+                self.lines.set(text, scopes)
+
+            regions.extend(sublime.Region(line.a + begin, line.a + end)
+                           for begin, end in scopes)
+
+        flags = sublime.DRAW_NO_FILL | sublime.DRAW_NO_OUTLINE
+        flags |= sublime.DRAW_SOLID_UNDERLINE | sublime.HIDE_ON_MINIMAP
+        view.add_regions(region_key, regions, "markup.underline.link",
+                         flags=flags)
+
+
+def plugin_loaded():
+    """Underline the paths in the active views."""
+    for window in sublime.windows():
+        view = window.active_view()
+        if view is not None:
+            UnderlineListener().on_activated(view)
+
+
+def is_visible(view):
+    """Whether a view is shown in any group of its window."""
+    window = view.window()
+    if window is None:
+        return False
+
+    return any(window.active_view_in_group(group) == view
+               for group in range(window.num_groups()))
+
+
+def get_underliner(view):
+    """Get the underliner of a view (or None if it can't have one)."""
+    if view.window() is None or view.settings().get("is_widget"):
+        return None
+
+    underliner = underliners.get(view.id())
+    if underliner is None:
+        underliner = underliners[view.id()] = PathUnderliner(view)
+
+    return underliner
+
+
+class UnderlineListener(sublime_plugin.EventListener):
+    """Underline the paths in the visible part of the active view."""
+
+    def on_activated(self, view):
+        """Underline the paths when a view is activated."""
+        underliner = get_underliner(view)
+        if underliner is not None and underliner.is_enabled():
+            underliner.schedule()
+            underliner.start_polling()
+
+    def on_modified(self, view):
+        """Search the changed lines again."""
+        underliner = underliners.get(view.id())
+        if underliner is not None:
+            underliner.schedule()
+
+    def on_post_save(self, view):
+        """Search all lines again since new files might exist now.
+
+        Only the visible views are searched at once, the others are searched
+        when they are activated.
+        """
+        for underliner in underliners.values():
+            underliner.lines.clear()
+            if underliner.view == view or is_visible(underliner.view):
+                underliner.schedule()
+
+    def on_close(self, view):
+        """Forget about the underliner of a closed view."""
+        underliners.pop(view.id(), None)